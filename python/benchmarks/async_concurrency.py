@@ -0,0 +1,130 @@
+"""
+Requests/sec of PDFChat (one thread per session) vs AsyncPDFChat at several
+numbers of simultaneous chat sessions, against a local stub Ollama server.
+
+Usage (from the python/ directory):
+    python benchmarks/async_concurrency.py [data/sample.pdf] [--sessions 1 8 32] [--latency 0.2]
+
+Without a PDF the sessions ask greetings, which skip retrieval, so the run
+measures the Ollama round trip alone.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.ollama_client as ollama_client
+from src.async_chat import AsyncPDFChat
+from src.chat_copy import PDFChat
+from src.ollama_client import OllamaClient, AsyncOllamaClient
+
+CONTENT_QUESTIONS = [
+    "What is this document about?",
+    "Summarize the main findings.",
+    "What methods are described?",
+    "List the key dates mentioned.",
+]
+GENERIC_QUESTIONS = ["hello there", "hi, what can you do?", "thanks!", "hey"]
+
+
+def start_stub_ollama(latency):
+    """
+    Serve /api/chat and /v1/completions on a free local port, answering
+    after `latency` seconds.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)  # stands in for generation time
+            if self.path == "/api/chat":
+                body = json.dumps({"message": {"role": "assistant", "content": "stub answer"}, "done": True}).encode()
+            else:
+                body = json.dumps({"choices": [{"text": "stub answer"}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 128  # the default backlog of 5 drops bursts of new connections
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_threads(chat, questions, sessions, requests_per_session):
+    def session(offset):
+        for i in range(requests_per_session):
+            chat.get_answer(questions[(offset + i) % len(questions)])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    return time.perf_counter() - started
+
+
+async def run_async(chat, questions, sessions, requests_per_session):
+    async def session(offset):
+        for i in range(requests_per_session):
+            await chat.get_answer(questions[(offset + i) % len(questions)])
+
+    started = time.perf_counter()
+    await asyncio.gather(*[session(offset) for offset in range(sessions)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf_path", nargs="?", help="PDF to ask content questions about")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=8, help="Questions asked per session")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub generation time in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_ollama(args.latency)
+    sync_chat, async_chat = PDFChat(), AsyncPDFChat()
+    # Repeated questions would otherwise be answered from the cache, not the stub
+    sync_chat.answer_cache = async_chat.answer_cache = None
+    questions = GENERIC_QUESTIONS
+    if args.pdf_path:
+        sync_chat.load_pdf(args.pdf_path)
+        async_chat.load_pdf(args.pdf_path)
+        questions = CONTENT_QUESTIONS
+
+    print(f"stub latency {args.latency:.3f}s, {args.requests} questions per session")
+    print(f"{'sessions':<10}{'threads req/s':>15}{'async req/s':>13}")
+    for sessions in args.sessions:
+        total = sessions * args.requests
+        ollama_client._client = OllamaClient(base_url=base_url, pool_size=sessions)
+        sync_seconds = run_threads(sync_chat, questions, sessions, args.requests)
+
+        async def measure():
+            async_chat.client = AsyncOllamaClient(base_url=base_url, pool_size=sessions)
+            try:
+                return await run_async(async_chat, questions, sessions, args.requests)
+            finally:
+                await async_chat.client.aclose()
+
+        async_seconds = asyncio.run(measure())
+        print(f"{sessions:<10}{total / sync_seconds:>15.1f}{total / async_seconds:>13.1f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Recall-vs-latency report for the FAISS index types in src/vector_store.
+
+Usage (from the python/ directory):
+    python benchmarks/index_recall.py data/sample.pdf [--queries 200] [--top-k 10]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedder import embed_queries, embed_text
+from src.pdf_extractor import iter_pages
+from src.pipeline import chunk_pages
+from src.vector_store import recall_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf_paths", nargs="+", help="PDFs to build the corpus from")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query chunks")
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts = [chunk.text for path in args.pdf_paths for chunk in chunk_pages(iter_pages(path))]
+    if not texts:
+        sys.exit("No text found in the given PDFs.")
+    embeddings = embed_text(texts)
+
+    # Query with the first sentence-ish slice of sampled chunks
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+    queries = embed_queries([" ".join(texts[i].split()[:20]) for i in sample])
+
+    print(f"{len(texts)} chunks, {len(queries)} queries, recall@{args.top_k} vs flat")
+    print(f"{'index':<10}{'recall':>8}{'ms/query':>11}{'build s':>9}")
+    for row in recall_report(embeddings, queries, args.top_k):
+        print(f"{row['index_type']:<10}{row['recall']:>8.3f}{row['latency_ms']:>11.3f}{row['build_seconds']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
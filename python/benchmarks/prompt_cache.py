@@ -0,0 +1,133 @@
+"""
+Ollama prompt-eval time per question with the old single-string prompt
+layout vs the chat layout (fixed system message, then document metadata,
+then the excerpts and question).
+
+Needs a running Ollama server with the model pulled. Ollama reports how many
+prompt tokens it actually evaluated; tokens found in the runner's prompt
+cache are skipped, so the stable-prefix layout should evaluate far fewer.
+
+Usage (from the python/ directory):
+    python benchmarks/prompt_cache.py data/sample.pdf [--model llama3.2] [--rounds 2]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chat_copy import PDFChat
+from src.config import OLLAMA_MODEL, OLLAMA_KEEP_ALIVE
+from src.ollama_client import get_client
+
+QUESTIONS = [
+    "What is this document about?",
+    "Summarize the main findings.",
+    "What methods are described?",
+    "List the key dates mentioned.",
+    "What conclusions does the author draw?",
+    "Which data sources are used?",
+]
+
+# build_enhanced_prompt before the chat layout: the per-question context
+# sits between the document information and the guidelines
+LEGACY_TEMPLATE = """You are an intelligent PDF analysis assistant with deep understanding of document content.
+
+DOCUMENT INFORMATION:
+{meta}
+
+YOUR ROLE:
+- Provide accurate, detailed answers based ONLY on the document content provided
+- Use the context below to answer questions precisely
+- If information is not in the context, clearly state "This information is not available in the provided document"
+- Cite specific details from the context when answering
+- Provide clear, well-structured responses
+- If asked about page numbers or specific sections, reference them if available in context
+
+CONTEXT FROM DOCUMENT:
+{context}
+
+IMPORTANT GUIDELINES:
+1. Answer based ONLY on the context provided above
+2. Be specific and reference exact information from the context
+3. If the context doesn't contain enough information, say so clearly
+4. Don't make assumptions beyond what's in the document
+5. Structure your answer clearly with relevant details
+6. If multiple pieces of information are relevant, organize them logically
+
+USER QUESTION: {query}
+
+ANSWER (based on the document context):"""
+
+
+def collect_prompts(chat, questions):
+    """
+    (legacy prompt, chat messages) for each question, from the same retrieval.
+    """
+    captured = []
+    build = chat.build_enhanced_prompt
+    chat.build_enhanced_prompt = lambda query, context, meta: captured.append((query, context, meta)) or build(
+        query, context, meta
+    )
+    prompts = []
+    for question in questions:
+        kind, messages, _ = chat.prepare_answer(question)
+        if kind != "prompt" or not captured:
+            continue
+        query, context, meta = captured.pop()
+        prompts.append((LEGACY_TEMPLATE.format(meta=meta, context=context, query=query), messages))
+    return prompts
+
+
+def prompt_eval(response):
+    response.raise_for_status()
+    result = response.json()
+    return result.get("prompt_eval_count", 0), result.get("prompt_eval_duration", 0) / 1e6
+
+
+def run(label, calls):
+    counts, millis = [], []
+    for call in calls:
+        count, ms = prompt_eval(call())
+        counts.append(count)
+        millis.append(ms)
+    print(f"{label:<22}{sum(counts) / len(counts):>14.0f}{sum(millis) / len(millis):>16.1f}{sum(millis):>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf_path", help="PDF to ask questions about")
+    parser.add_argument("--model", default=OLLAMA_MODEL)
+    parser.add_argument("--rounds", type=int, default=2, help="Times the question list is asked")
+    parser.add_argument("--num-predict", type=int, default=1, help="Tokens generated per answer")
+    args = parser.parse_args()
+
+    chat = PDFChat()
+    chat.answer_cache = None
+    chat.load_pdf(args.pdf_path)
+    prompts = collect_prompts(chat, QUESTIONS) * args.rounds
+    if not prompts:
+        sys.exit("No content questions could be built for this PDF.")
+
+    client = get_client()
+    options = {"num_predict": args.num_predict, "temperature": 0}
+
+    def generate(prompt):
+        return lambda: client.generate({"model": args.model, "prompt": prompt, "stream": False,
+                                        "keep_alive": OLLAMA_KEEP_ALIVE, "options": options})
+
+    def chat_call(messages):
+        return lambda: client.chat({"model": args.model, "messages": messages,
+                                    "keep_alive": OLLAMA_KEEP_ALIVE, "options": options})
+
+    # Load the model first so neither layout pays for it
+    prompt_eval(generate("Hello")())
+
+    print(f"{args.model}, {len(prompts)} questions, keep_alive {OLLAMA_KEEP_ALIVE}")
+    print(f"{'layout':<22}{'prompt tokens':>14}{'prompt-eval ms':>16}{'total ms':>12}")
+    run("single string (old)", [generate(legacy) for legacy, _ in prompts])
+    run("chat, stable prefix", [chat_call(messages) for _, messages in prompts])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.config import (
+    ANSWER_CACHE_ENABLED, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX_ENTRIES
+)
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+class AnswerCache:
+    """
+    In-process cache of LLM answers for repeated and near-duplicate questions.
+
+    Answers are grouped by a context key (document fingerprint, model,
+    prompt template version, ...). A question hits when its normalized
+    text was asked before under the same key, or when its embedding is
+    within `threshold` cosine similarity of a cached question. Entries
+    expire after `ttl` seconds; past `max_entries` the least recently
+    used answer is evicted.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (key, query) -> entry, least recently used first
+        self._by_key = {}  # key -> {query: entry}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _drop(self, key, query):
+        self._entries.pop((key, query), None)
+        bucket = self._by_key.get(key)
+        if bucket is not None:
+            bucket.pop(query, None)
+            if not bucket:
+                del self._by_key[key]
+
+    def _expire(self, key, now):
+        for query, entry in list(self._by_key.get(key, {}).items()):
+            if now - entry["created"] > self.ttl:
+                self._drop(key, query)
+
+    def lookup(self, key, query, embedding):
+        """
+        Cached answer for `query` (normalized text) under `key`, or None.
+        """
+        with self._lock:
+            self._expire(key, time.time())
+            bucket = self._by_key.get(key, {})
+
+            entry = bucket.get(query)
+            if entry is not None:
+                self.exact_hits += 1
+            elif bucket:
+                candidates = list(bucket.values())
+                scores = np.stack([c["embedding"] for c in candidates]) @ _unit(embedding)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry = candidates[best]
+                    self.semantic_hits += 1
+                    logger.info(f"Answer cache: '{query}' matched '{entry['query']}' ({scores[best]:.3f})")
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, entry["query"]))
+            return entry["answer"]
+
+    def store(self, key, query, embedding, answer):
+        with self._lock:
+            self._drop(key, query)
+            entry = {"query": query, "embedding": _unit(embedding), "answer": answer, "created": time.time()}
+            self._entries[(key, query)] = entry
+            self._by_key.setdefault(key, {})[query] = entry
+            while len(self._entries) > self.max_entries:
+                old_key, old_query = next(iter(self._entries))
+                self._drop(old_key, old_query)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_key.clear()
+
+    def stats(self):
+        """
+        Hit and miss counts and hit rate since start-up.
+        """
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide AnswerCache shared by every chat session, or
+    None when the cache is disabled in config.
+    """
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
@@ -1,17 +1,19 @@
 import streamlit as st
 import os
 import sys
-import time
 import re
 
 # Add parent directory to path to import from src
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.chat_copy import PDFChat
+from src.embedder import warm_up, is_model_loaded
+from src.reranker import get_rerank_stats
+from src.context_packer import get_packing_stats
 from src.config import (
     CHUNK_SIZE, CHUNK_OVERLAP, TOP_K,
     OLLAMA_MODEL, VISION_MODEL, VISION_MODEL_FALLBACK,
-    AVAILABLE_VISION_MODELS, AUTO_FALLBACK
+    AVAILABLE_VISION_MODELS, AUTO_FALLBACK, RERANK_ENABLED
 )
 from PyPDF2 import PdfReader
 from PIL import Image
@@ -453,34 +455,16 @@ def detect_code_in_text(text):
     ]
     return any(indicator in text for indicator in code_indicators)
 
-def stream_text(text, delay=0.015):
-    """Stream text with smart pausing at section boundaries"""
-    # Split by major sections
-    sections = re.split(r'(\n\n+)', text)
-    streamed_text = ""
+def stream_text(response):
+    """Yield the accumulated answer as tokens arrive from the model"""
+    if isinstance(response, str):
+        yield response
+        return
     
-    for section in sections:
-        if section.strip():
-            # Check if it's a code block
-            if '```' in section:
-                # Show code blocks instantly
-                streamed_text += section
-                yield streamed_text
-            else:
-                # Stream words with slight pause at punctuation
-                words = section.split()
-                for word in words:
-                    streamed_text += word + " "
-                    yield streamed_text
-                    
-                    # Longer pause at sentence ends
-                    if word.endswith(('.', '!', '?', ':')):
-                        time.sleep(delay * 2)
-                    else:
-                        time.sleep(delay)
-        else:
-            streamed_text += section
-            yield streamed_text
+    streamed_text = ""
+    for piece in response:
+        streamed_text += piece
+        yield streamed_text
 
 def load_pdf(pdf_file):
     """Load and process the PDF file"""
@@ -495,7 +479,7 @@ def load_pdf(pdf_file):
         st.session_state.current_pdf_path = pdf_path
         
         with st.spinner("🔄 Processing PDF... Extracting text and images..."):
-            st.session_state.pdf_chat.build_index(pdf_path)
+            st.session_state.pdf_chat.load_pdf(pdf_path)
             st.session_state.pdf_loaded = True
             st.session_state.chat_history = []
         
@@ -524,6 +508,15 @@ def display_pdf_info():
             
             if st.session_state.pdf_chat.image_handler.images:
                 st.info(f"🖼️ **{len(st.session_state.pdf_chat.image_handler.images)}** images found")
+            
+            corpus_docs = len(st.session_state.pdf_chat.corpus.documents)
+            if corpus_docs > 1:
+                search_all = st.toggle(
+                    f"🔎 Search all {corpus_docs} indexed documents",
+                    value=st.session_state.pdf_chat.search_scope == "corpus",
+                    help="Answer from every PDF processed so far, not just this one"
+                )
+                st.session_state.pdf_chat.search_scope = "corpus" if search_all else "document"
 
 def display_model_selector():
     """Display model selection interface in sidebar"""
@@ -644,6 +637,11 @@ def main():
         )
         
         if uploaded_file is not None:
+            # Start loading the embedding model while the user clicks Process
+            if not is_model_loaded() and not st.session_state.get('embedder_warming'):
+                st.session_state.embedder_warming = True
+                warm_up(background=True)
+            
             if st.button("🚀 Process PDF", type="primary", use_container_width=True):
                 if load_pdf(uploaded_file):
                     st.rerun()
@@ -690,12 +688,16 @@ def main():
             """)
         
         with st.expander("⚙️ System Status"):
+            answer_cache = st.session_state.pdf_chat.answer_cache
             st.code(f"""
 Text:  {st.session_state.selected_text_model}
 Vision: {st.session_state.selected_vision_model}
 Fallback: {'On' if st.session_state.auto_fallback_enabled else 'Off'}
 PDF: {'Loaded' if st.session_state.pdf_loaded else 'None'}
 Images: {len(st.session_state.pdf_chat.image_handler.images) if st.session_state.pdf_loaded else 0}
+Answer cache hit rate: {answer_cache.stats()['hit_rate'] if answer_cache else 'Off'}
+Rerank latency: {f"{get_rerank_stats()['mean_ms']} ms (mean)" if RERANK_ENABLED else 'Off'}
+Prompt tokens saved: {get_packing_stats()['tokens_saved']}
             """, language="yaml")
     
     # Main chat area
@@ -795,10 +797,10 @@ Images: {len(st.session_state.pdf_chat.image_handler.images) if st.session_state
                     else:
                         # Text query with streaming
                         st.session_state.is_generating = True
-                        response = st.session_state.pdf_chat.get_answer(user_input)
+                        response = st.session_state.pdf_chat.get_answer(user_input, stream=True)
                         
                         full_response = ""
-                        for chunk in stream_text(response, delay=0.01):
+                        for chunk in stream_text(response):
                             full_response = chunk
                             message_placeholder.markdown(chunk + "▌")
                         
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import httpx
+from src.chat_copy import PDFChat, StreamError, STREAM_TIMED_OUT, STREAM_DROPPED, llm_payload, completion_text
+from src.config import OLLAMA_MODEL
+from src.ollama_client import get_async_client
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+class AsyncPDFChat(PDFChat):
+    """
+    asyncio variant of PDFChat for servers handling many chat sessions.
+
+    Text generation is awaited on the event loop, so an in-flight answer
+    holds a pooled connection instead of a thread. Vision calls are
+    awaited on the process-wide vision scheduler. Query embedding and FAISS search are CPU-bound and run in the default
+    executor. Indexing and loading PDFs stay blocking; wrap load_pdf in
+    asyncio.to_thread when calling it from a loop.
+    """
+
+    def __init__(self, client=None):
+        super().__init__()
+        self.client = client
+
+    def _client(self):
+        return self.client or get_async_client()
+
+    async def ollama_query(self, prompt, model_name=OLLAMA_MODEL, stream=False):
+        """
+        Async version of PDFChat.ollama_query. With stream=True, returns an
+        async generator yielding text as it is generated.
+        """
+        data = llm_payload(prompt, model_name)
+
+        if stream:
+            return self._stream_ollama(data)
+
+        try:
+            if "messages" in data:
+                response = await self._client().chat(data)
+            else:
+                response = await self._client().completions(data)
+            if response.status_code == 200:
+                res_json = response.json()
+                logger.debug(f"Ollama raw response: {json.dumps(res_json, indent=2)}")
+                return completion_text(res_json)
+            else:
+                return f"Ollama error {response.status_code}: {response.text}"
+
+        except (httpx.RemoteProtocolError, httpx.ReadError):
+            return "Response interrupted: the connection to Ollama was lost. Please ask again."
+        except httpx.ConnectError:
+            return "Cannot connect to Ollama. Make sure 'ollama serve' is running."
+        except httpx.TimeoutException:
+            return "Ollama took too long to respond. Try a shorter question or a smaller model."
+
+    async def _stream_ollama(self, data):
+        started = False
+        try:
+            if "messages" in data:
+                pieces = self._client().stream_chat(data)
+            else:
+                pieces = self._client().stream_completions(data)
+            async for text in pieces:
+                started = True
+                yield text
+        except httpx.HTTPStatusError as e:
+            yield StreamError(e)
+        except httpx.ReadTimeout:
+            if started:
+                yield StreamError(STREAM_TIMED_OUT)
+            else:
+                yield StreamError("Ollama took too long to respond. Try a shorter question or a smaller model.")
+        except (httpx.RemoteProtocolError, httpx.ReadError):
+            yield StreamError(STREAM_DROPPED)
+        except httpx.ConnectError:
+            yield StreamError("Cannot connect to Ollama. Make sure 'ollama serve' is running.")
+        except httpx.TimeoutException:
+            yield StreamError("Ollama took too long to respond. Try a shorter question or a smaller model.")
+
+    async def answer_image_query_async(self, action, page_num, topic):
+        """
+        Image commands that call the vision model run concurrently on the
+        loop; the rest are cheap and reuse the blocking implementation.
+        """
+        if action == "search_topic":
+            results = await self.image_handler.search_images_by_topic_async(topic)
+            return self.report_topic_results(topic, results)
+
+        elif action == "analyze_page":
+            images = self.image_handler.get_images_by_page(page_num)
+            if not images:
+                return f"No images found on page {page_num}."
+            logger.info(f"Analyzing {len(images)} image(s) on page {page_num}...")
+            descriptions = await self.image_handler.analyze_images_async(images)
+            for img, description in zip(images, descriptions):
+                logger.info(f"\n--- Image {img['index']}: {img['filename']} ---")
+                logger.info(description)
+            return ""
+
+        elif action == "open_and_analyze":
+            return await asyncio.to_thread(self.answer_image_query, action, page_num, topic)
+
+        return self.answer_image_query(action, page_num, topic)
+
+    async def get_answer(self, query, stream=False):
+        """
+        Async version of PDFChat.get_answer.
+        """
+        action, page_num, topic = self.image_action(query)
+        if action:
+            return await self.answer_image_query_async(action, page_num, topic)
+
+        # Embedding the query and searching the index are CPU work
+        kind, value, cache_slot = await asyncio.to_thread(self.prepare_answer, query)
+        if kind == "prompt":
+            return self.remember_answer(cache_slot, await self.ollama_query(value, stream=stream))
+        return value
+
+    def remember_answer(self, cache_slot, answer):
+        if cache_slot is not None and not isinstance(answer, str):
+            return self._remember_async_stream(cache_slot, answer)
+        return super().remember_answer(cache_slot, answer)
+
+    async def _remember_async_stream(self, cache_slot, pieces):
+        received = []
+        failed = False
+        async for piece in pieces:
+            received.append(piece)
+            failed = failed or isinstance(piece, StreamError)
+            yield piece
+        if not failed:
+            super().remember_answer(cache_slot, "".join(received))
@@ -1,206 +1,546 @@
-from src.chunker import chunk_text
-from src.embedder import embed_text, model
-from src.vector_store import create_index, search_index, save_index, load_index
-from src.pdf_extractor import extract_text
-from src.config import CHUNK_SIZE, CHUNK_OVERLAP, TOP_K, OLLAMA_MODEL, OLLAMA_URL
+from src.chunker import rebase_chunk, page_offsets_from_lengths, contiguous_runs
+from src.embedder import embed_query
+from src.corpus import get_corpus
+from src.lexical_index import reciprocal_rank_fusion
+from src.reranker import rerank
+from src.context_packer import pack_context, context_token_budget
+from src.pdf_extractor import get_page_count, page_fingerprints
+from src.pipeline import iter_embedded_batches
+from src.doc_store import file_fingerprint
+from src.pdf_document import PDFDocument
+from src.config import (
+    TOP_K, OLLAMA_MODEL, RETRIEVAL_SCOPE, INCREMENTAL_MAX_CHANGED_FRACTION, PROMPT_TEMPLATE_VERSION, VISION_PRECAPTION,
+    RETRIEVAL_MODE, HYBRID_CANDIDATES, RRF_K, RERANK_ENABLED, RERANK_CANDIDATES, OLLAMA_API, OLLAMA_KEEP_ALIVE
+)
+from src.answer_cache import get_answer_cache
 from src.image_handler import ImageHandler
-from src.query_parser import parse_image_query
+from src.query_parser import parse_image_query, parse_page_filter, normalize_query
 from src.model_manager import ModelManager
+from src.ollama_client import get_client
 from src.utils import setup_logging
 import requests
+import hashlib
 import json
 import os
-from PyPDF2 import PdfReader
+import shutil
 
 logger = setup_logging()
 
+
+class StreamError(str):
+    """
+    Error message a streamed answer yields in place of (or after) text.
+    Streams that yield one are shown to the user but never cached.
+    """
+
+
+# Messages ollama_query returns in place of an answer; these are never cached
+OLLAMA_ERROR_PREFIXES = (
+    "Ollama error", "Cannot connect to Ollama", "Ollama took too long", "Response interrupted",
+    "[No completion returned]"
+)
+# Shown after the partial text when a streamed answer breaks off
+STREAM_TIMED_OUT = "\n\n[Response interrupted: Ollama stopped sending text. Please ask again.]"
+STREAM_DROPPED = "\n\n[Response interrupted: the connection to Ollama was lost. Please ask again.]"
+
+# Fixed instructions sent ahead of every question, so the model's prompt
+# cache can reuse them
+RAG_SYSTEM_PROMPT = """You are an intelligent PDF analysis assistant with deep understanding of document content.
+
+YOUR ROLE:
+- Provide accurate, detailed answers based ONLY on the document content provided
+- Use the context excerpts in the user's message to answer questions precisely
+- If information is not in the context, clearly state "This information is not available in the provided document"
+- Cite specific details from the context when answering
+- Provide clear, well-structured responses
+- If asked about page numbers or specific sections, reference them if available in context
+
+IMPORTANT GUIDELINES:
+1. Answer based ONLY on the context provided with the question
+2. Be specific and reference exact information from the context
+3. If the context doesn't contain enough information, say so clearly
+4. Don't make assumptions beyond what's in the document
+5. Structure your answer clearly with relevant details
+6. If multiple pieces of information are relevant, organize them logically"""
+
+GENERIC_SYSTEM_PROMPT = """You are a helpful AI assistant for PDF document analysis.
+
+INSTRUCTIONS:
+- If asked about the document itself (filename, pages, size), use the document information provided
+- For general greetings or conversation, respond naturally and friendly
+- If asked about document content but no specific context is available, inform the user you need more specific questions to search the document
+- Be concise and helpful"""
+
+
+def llm_payload(prompt, model_name):
+    """
+    Request body for the configured Ollama API (OLLAMA_API). `prompt` is a
+    list of chat messages or a plain string; for /v1/completions the
+    messages are joined in order into one prompt.
+    """
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+    if OLLAMA_API == "chat":
+        return {
+            "model": model_name,
+            "messages": messages,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": {"num_predict": 500, "temperature": 0.7, "top_p": 0.9},
+        }
+    return {
+        "model": model_name,
+        "prompt": "\n\n".join(message["content"] for message in messages) + "\n\nANSWER:",
+        "max_tokens": 500,
+        "temperature": 0.7,
+        "top_p": 0.9,
+    }
+
+
+def completion_text(res_json):
+    """
+    Answer text of an /api/chat or /v1/completions response.
+    """
+    if "message" in res_json:
+        return res_json["message"].get("content") or "[No completion returned]"
+    if "choices" in res_json and len(res_json["choices"]) > 0:
+        return res_json["choices"][0].get("text", "[No completion returned]")
+    return "[No completion returned]"
+
+
 class PDFChat:
     def __init__(self):
         self.chunks = []
+        self.page_index = {}
         self.index = None
+        self.doc_id = None
+        self.corpus = get_corpus()
+        self.search_scope = RETRIEVAL_SCOPE
         self.pdf_info = {}
         self.image_handler = ImageHandler()
         self.model_manager = ModelManager()
+        self.answer_cache = get_answer_cache()
 
-    def ollama_query(self, prompt, model_name=OLLAMA_MODEL):
+    def ollama_query(self, prompt, model_name=OLLAMA_MODEL, stream=False):
         """
-        Sends prompt to local Ollama LLaMA3 endpoint via /v1/completions.
+        Sends prompt (chat messages or text) to the local Ollama server via
+        /api/chat, or /v1/completions when OLLAMA_API is "completions".
+        With stream=True, returns a generator yielding text as it is generated.
         """
-        headers = {"Content-Type": "application/json"}
-        data = {
-            "model": model_name,
-            "prompt": prompt,
-            "max_tokens": 500,
-            "temperature": 0.7,
-            "top_p": 0.9,
-        }
+        data = llm_payload(prompt, model_name)
+
+        if stream:
+            return self._stream_ollama(data)
 
         try:
-            response = requests.post(OLLAMA_URL, headers=headers, data=json.dumps(data))
+            if "messages" in data:
+                response = get_client().chat(data)
+            else:
+                response = get_client().completions(data)
             if response.status_code == 200:
                 res_json = response.json()
                 logger.debug(f"Ollama raw response: {json.dumps(res_json, indent=2)}")
-
-                if "choices" in res_json and len(res_json["choices"]) > 0:
-                    return res_json["choices"][0].get("text", "[No completion returned]")
-                else:
-                    return "[No completion returned]"
+                return completion_text(res_json)
             else:
                 return f"Ollama error {response.status_code}: {response.text}"
 
+        except requests.exceptions.ChunkedEncodingError:
+            return "Response interrupted: the connection to Ollama was lost. Please ask again."
         except requests.exceptions.ConnectionError:
             return "Cannot connect to Ollama. Make sure 'ollama serve' is running."
+        except requests.exceptions.Timeout:
+            return "Ollama took too long to respond. Try a shorter question or a smaller model."
 
-    def build_index(self, pdf_path):
+    def _stream_ollama(self, data):
         """
-        Build FAISS index for the PDF.
+        Yield completion text from Ollama token by token; errors are
+        yielded as a StreamError so the UI can show them in place.
         """
-        # Extract metadata
+        started = False
+        try:
+            if "messages" in data:
+                pieces = get_client().stream_chat(data)
+            else:
+                pieces = get_client().stream_completions(data)
+            for text in pieces:
+                started = True
+                yield text
+        except requests.exceptions.HTTPError as e:
+            yield StreamError(e)
+        except requests.exceptions.ReadTimeout:
+            if started:
+                yield StreamError(STREAM_TIMED_OUT)
+            else:
+                yield StreamError("Ollama took too long to respond. Try a shorter question or a smaller model.")
+        except requests.exceptions.ChunkedEncodingError:
+            yield StreamError(STREAM_DROPPED)
+        except requests.exceptions.ConnectionError:
+            yield StreamError("Cannot connect to Ollama. Make sure 'ollama serve' is running.")
+        except requests.exceptions.Timeout:
+            yield StreamError("Ollama took too long to respond. Try a shorter question or a smaller model.")
+
+    def read_pdf_info(self, pdf_path, document=None):
+        """
+        Basic file metadata shown to the user and the LLM.
+        """
+        if document is not None:
+            return document.info()
         file_stats = os.stat(pdf_path)
-        reader = PdfReader(pdf_path)
-        self.pdf_info = {
+        return {
             "file_name": os.path.basename(pdf_path),
-            "page_count": len(reader.pages),
+            "page_count": get_page_count(pdf_path),
             "file_size_kb": round(file_stats.st_size / 1024, 2),
             "format": "PDF Document",
         }
 
-        # Extract images
-        self.image_handler.extract_images_from_pdf(pdf_path)
+    def build_index(self, pdf_path, pdf_hash=None, document=None):
+        """
+        Build FAISS index for the PDF.
+        Metadata, fingerprints, images and text all come from one open
+        PDFDocument, so the file is read and parsed once.
+        """
+        if document is None:
+            with PDFDocument(pdf_path) as document:
+                return self.build_index(pdf_path, pdf_hash, document)
 
-        # Extract text
-        text = extract_text(pdf_path)
-        if not text or not text.strip():
-            logger.warning("No text detected in this PDF. Skipping text embedding.")
-            self.chunks, self.index = [], None
-            save_index(None)
+        self.doc_id = pdf_hash or document.content_hash
+
+        # Extract metadata
+        self.pdf_info = self.read_pdf_info(pdf_path, document)
+        fingerprints = page_fingerprints(pdf_path, document)
+
+        # A re-upload of a revised PDF only re-indexes the pages that changed
+        previous_id = self.corpus.find_previous_version(self.pdf_info["file_name"], self.doc_id)
+        if previous_id and self.update_index(pdf_path, previous_id, fingerprints, document):
             return
 
-        # Continue normally if text exists
-        self.chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
-        embeddings = embed_text(self.chunks)
-        self.index = create_index(embeddings)
-        save_index(self.index)
+        # Extract images
+        self.image_handler.extract_images_from_pdf(pdf_path, self.image_dir(self.doc_id), document=document)
+
+        # Stream pages -> chunks -> embeddings into the shared corpus index;
+        # a fully rebuilt revision replaces its previous version
+        page_lengths = []
+        self.chunks = self.corpus.add_document(
+            self.doc_id,
+            iter_embedded_batches(pdf_path, page_lengths=page_lengths, document=document),
+            self.pdf_info,
+            self.image_handler.images,
+            fingerprints,
+            page_lengths,
+            replaces=previous_id,
+        )
+        if previous_id:
+            shutil.rmtree(self.image_dir(previous_id), ignore_errors=True)
+        self.page_index = self.chunks.page_index()
+        self.index = self.corpus.index
+        if VISION_PRECAPTION and self.image_handler.images:
+            self.image_handler.precaption_images()
+        if not self.chunks:
+            logger.warning("No text detected in this PDF. Skipping text embedding.")
 
         logger.info(f"Index created with {len(self.chunks)} chunks for {self.pdf_info['file_name']}.")
 
-    def load_existing_index(self):
+    def update_index(self, pdf_path, previous_id, fingerprints, document=None):
         """
-        Load existing FAISS index.
+        Re-index a revised PDF incrementally against its previous version.
+        For each run of changed pages, chunking restarts at the start of the
+        last old chunk before the run and stops as soon as a new chunk
+        matches an old one after it; from there on the chunker would repeat
+        the old chunks. Only the chunks in between are re-embedded, stale
+        vectors are removed by id and every other chunk is kept, so the
+        result is the same as a full rebuild.
+        Returns False when a full rebuild is the better option.
         """
-        self.index = load_index()
-        if self.index is None:
-            logger.warning("No existing index found. Building new index is required.")
-        else:
-            logger.info("FAISS index loaded successfully.")
+        stored = self.corpus.load_document(previous_id)
+        if stored is None:
+            return False
+        old_chunks, manifest = stored
+        old_fingerprints = manifest.get("page_fingerprints") or []
+        old_lengths = manifest.get("page_lengths") or []
+        if not old_fingerprints or len(old_lengths) != len(old_fingerprints):
+            return False
+
+        page_count = len(fingerprints)
+        changed = {
+            page for page in range(1, page_count + 1)
+            if page > len(old_fingerprints) or fingerprints[page - 1] != old_fingerprints[page - 1]
+        }
+        touched = changed | set(range(page_count + 1, len(old_fingerprints) + 1))
+        if len(changed) > page_count * INCREMENTAL_MAX_CHANGED_FRACTION:
+            logger.info(f"{len(changed)} of {page_count} pages changed; rebuilding the whole index.")
+            return False
+        logger.info(f"Incremental re-index of {self.pdf_info['file_name']}: {len(changed)} changed pages.")
+
+        # Old chunks in document order, and the ones a resumed chunker can
+        # line up with again: those clear of every changed page, by start
+        columns = old_chunks.columns
+        order = sorted(range(len(columns)), key=lambda i: (int(columns["char_start"][i]), int(columns["chunk_id"][i])))
+        spans = [
+            (int(columns["chunk_id"][i]), int(columns["page_start"][i]), int(columns["page_end"][i]),
+             int(columns["char_start"][i]), int(i))
+            for i in order
+        ]
+        old_offsets = page_offsets_from_lengths(old_lengths)
+        resync_points = {
+            (first, char_start - old_offsets[first - 1]): position
+            for position, (_, first, last, char_start, _) in enumerate(spans)
+            if touched.isdisjoint(range(first, last + 1))
+        }
 
-    def build_enhanced_prompt(self, query, context, pdf_meta_context):
+        stale_ids = set()
+        lengths = old_lengths[:page_count] + [0] * max(page_count - len(old_lengths), 0)
+        next_chunk_id = int(columns["chunk_id"].max()) + 1 if len(columns) else 0
+
+        def redo_batches():
+            nonlocal next_chunk_id
+            position = 0  # first old chunk not yet kept or replaced
+            covered = 0  # last page a previous run re-chunked up to
+            for first, _ in contiguous_runs(touched):
+                if first <= covered:
+                    continue
+                # Resume at the last old chunk ending before the run; it starts
+                # where a full rebuild would start a chunk too
+                restart = position
+                while restart + 1 < len(spans) and spans[restart + 1][2] < first:
+                    restart += 1
+                if restart < len(spans) and spans[restart][2] < first:
+                    _, start_page, _, char_start, _ = spans[restart]
+                    skip = char_start - old_offsets[start_page - 1]
+                else:
+                    # No old chunk ends before the run: start from the first page
+                    restart, start_page, skip = position, 1, 0
+                run_lengths = []
+                run_offsets = [page_offsets_from_lengths(lengths[:start_page])[start_page - 1]]
+                resynced = [len(spans)]
+
+                def page_offset(page):
+                    while len(run_offsets) <= page - start_page:
+                        length = run_lengths[len(run_offsets) - 1]
+                        run_offsets.append(run_offsets[-1] + (length + 1 if length else 0))
+                    return run_offsets[page - start_page]
+
+                def lined_up(chunk):
+                    # A new chunk equal to an old one past the run: the rest repeats
+                    match = resync_points.get((chunk.page_start, chunk.char_start - page_offset(chunk.page_start)))
+                    if match is None or match < position or spans[match][1] <= first:
+                        return False
+                    if old_chunks[spans[match][4]].text != chunk.text:
+                        return False
+                    resynced[0] = match
+                    return True
+
+                for batch, embeddings in iter_embedded_batches(
+                    pdf_path, first_page=start_page, last_page=page_count, start_offset=run_offsets[0],
+                    first_chunk_id=next_chunk_id, page_lengths=run_lengths, document=document,
+                    skip=skip, until=lined_up,
+                ):
+                    next_chunk_id = batch[-1].chunk_id + 1
+                    yield batch, embeddings
+                lengths[start_page - 1:start_page - 1 + len(run_lengths)] = run_lengths
+
+                end = resynced[0]
+                stale_ids.update(chunk_id for chunk_id, _, _, _, _ in spans[restart:end])
+                position = end
+                covered = spans[end][1] if end < len(spans) else len(old_fingerprints) + 1
+                logger.info(f"Re-chunked from page {start_page} to page "
+                            f"{spans[end][1] if end < len(spans) else page_count}.")
+
+        def rebased_chunks():
+            # Runs after redo_batches, once every page length is known
+            new_offsets = page_offsets_from_lengths(lengths)
+            for chunk in old_chunks:
+                if chunk.chunk_id not in stale_ids:
+                    yield rebase_chunk(chunk, old_offsets, new_offsets)
+
+        # Carry the unchanged pages' images over and re-extract the rest
+        self.image_handler.images = self.move_images(manifest.get("images", []), previous_id, self.doc_id)
+        self.image_handler.extract_images_from_pdf(
+            pdf_path, self.image_dir(self.doc_id), pages=touched, document=document
+        )
+
+        chunks = self.corpus.update_document(
+            previous_id, self.doc_id, stale_ids, rebased_chunks(), redo_batches(),
+            self.pdf_info, self.image_handler.images, fingerprints, lengths,
+        )
+        if chunks is None:
+            return False
+        self.chunks = chunks
+        self.page_index = self.chunks.page_index()
+        self.index = self.corpus.index
+        return True
+
+    def move_images(self, images, old_doc_id, new_doc_id):
         """
-        Build an enhanced prompt for better PDF-aware responses.
+        Move a document's extracted images to the folder of its new revision.
         """
-        prompt = f"""You are an intelligent PDF analysis assistant with deep understanding of document content.
+        old_dir, new_dir = self.image_dir(old_doc_id), self.image_dir(new_doc_id)
+        if os.path.isdir(old_dir) and not os.path.exists(new_dir):
+            os.rename(old_dir, new_dir)
+        moved = []
+        for img in images:
+            img = dict(img, path=os.path.join(new_dir, img["filename"]))
+            if os.path.exists(img["path"]):
+                moved.append(img)
+        return moved
+
+    @staticmethod
+    def image_dir(doc_id):
+        """
+        Each document extracts its images into its own folder so documents
+        in the corpus do not overwrite each other's files.
+        """
+        return os.path.join("data", "extracted_images", doc_id[:16])
 
-DOCUMENT INFORMATION:
-{pdf_meta_context}
+    def load_document(self, pdf_path, pdf_hash=None):
+        """
+        Restore a previously indexed PDF from the corpus. Returns False if it
+        is not in the corpus or its store is stale; no PDF parsing happens
+        either way.
+        """
+        doc_id = pdf_hash or file_fingerprint(pdf_path)
+        stored = self.corpus.load_document(doc_id)
+        if stored is None:
+            return False
+        chunks, manifest = stored
+
+        images = manifest.get("images", [])
+        if not all(os.path.exists(img["path"]) for img in images):
+            logger.info("Extracted images are missing; re-extracting them.")
+            self.image_handler.extract_images_from_pdf(pdf_path, self.image_dir(doc_id))
+        else:
+            self.image_handler.images = images
 
-YOUR ROLE:
-- Provide accurate, detailed answers based ONLY on the document content provided
-- Use the context below to answer questions precisely
-- If information is not in the context, clearly state "This information is not available in the provided document"
-- Cite specific details from the context when answering
-- Provide clear, well-structured responses
-- If asked about page numbers or specific sections, reference them if available in context
+        self.doc_id = doc_id
+        self.chunks, self.index = chunks, self.corpus.index
+        self.page_index = chunks.page_index()
+        self.pdf_info = manifest["pdf_info"]
+        logger.info(f"Loaded {len(chunks)} chunks for {self.pdf_info['file_name']} from the corpus.")
+        return True
 
-CONTEXT FROM DOCUMENT:
-{context}
+    def load_pdf(self, pdf_path):
+        """
+        Open a PDF, reusing the stored index when it was indexed before.
+        """
+        with PDFDocument(pdf_path) as document:
+            # Hashing only reads the mapped bytes; the PDF is parsed just for a build
+            if not self.load_document(pdf_path, document.content_hash):
+                self.build_index(pdf_path, document.content_hash, document)
 
-IMPORTANT GUIDELINES:
-1. Answer based ONLY on the context provided above
-2. Be specific and reference exact information from the context
-3. If the context doesn't contain enough information, say so clearly
-4. Don't make assumptions beyond what's in the document
-5. Structure your answer clearly with relevant details
-6. If multiple pieces of information are relevant, organize them logically
+    def get_chunk(self, doc_id, chunk_id):
+        if doc_id == self.doc_id:
+            return self.chunks.get(chunk_id)
+        return self.corpus.get_chunk(doc_id, chunk_id)
 
-USER QUESTION: {query}
+    def resolve_hits(self, hits):
+        """
+        (hit, Chunk) for retrieved (doc_id, chunk_id) pairs, skipping hits
+        whose document has left the corpus or has a stale store.
+        """
+        resolved = []
+        for hit in hits:
+            chunk = self.get_chunk(*hit)
+            if chunk is not None:
+                resolved.append((hit, chunk))
+        return resolved
+
+    def _source_label(self, doc_id, chunk):
+        if chunk.page_start == chunk.page_end:
+            label = f"page {chunk.page_start}"
+        else:
+            label = f"pages {chunk.page_start}-{chunk.page_end}"
+        if doc_id != self.doc_id:
+            label = f"{self.corpus.documents[doc_id]['file_name']}, {label}"
+        return label
 
-ANSWER (based on the document context):"""
-        
-        return prompt
+    def build_enhanced_prompt(self, query, context, pdf_meta_context):
+        """
+        Build the chat messages for a PDF-aware answer. The fixed instructions
+        come first and the document information next, so Ollama can reuse
+        their evaluation across questions; only the excerpts and question
+        at the end change.
+        """
+        return [
+            {"role": "system", "content": RAG_SYSTEM_PROMPT},
+            {"role": "system", "content": f"DOCUMENT INFORMATION:\n{pdf_meta_context}"},
+            {"role": "user", "content": f"CONTEXT FROM DOCUMENT:\n{context}\n\nUSER QUESTION: {query}"},
+        ]
 
     def build_generic_prompt(self, query, pdf_meta_context):
         """
-        Build a prompt for general conversation or document metadata queries.
+        Build the chat messages for general conversation or document
+        metadata queries, in the same stable-first order.
         """
-        prompt = f"""You are a helpful AI assistant for PDF document analysis.
+        return [
+            {"role": "system", "content": GENERIC_SYSTEM_PROMPT},
+            {"role": "system", "content": f"DOCUMENT INFORMATION:\n{pdf_meta_context}"},
+            {"role": "user", "content": f"USER QUERY: {query}"},
+        ]
 
-DOCUMENT INFORMATION:
-{pdf_meta_context}
-
-USER QUERY: {query}
-
-INSTRUCTIONS:
-- If asked about the document itself (filename, pages, size), use the document information above
-- For general greetings or conversation, respond naturally and friendly
-- If asked about document content but no specific context is available, inform the user you need more specific questions to search the document
-- Be concise and helpful
+    def image_action(self, query):
+        """
+        Parse an image command. Returns (None, None, None) for other queries.
+        """
+        query_lower = query.lower().strip()
+        if any(word in query_lower for word in ["image", "picture", "photo", "diagram", "figure"]):
+            return parse_image_query(query)
+        return (None, None, None)
 
-YOUR RESPONSE:"""
+    def answer_image_query(self, action, page_num, topic):
+        """
+        Run an image command parsed by image_action.
+        """
+        if action == "show_page_images":
+            images = self.image_handler.get_images_by_page(page_num)
+            if images:
+                logger.info(f"Images on page {page_num}:")
+                for img in images:
+                    logger.info(f"  {img['index']}. {img['filename']} ({img['format']}, {img['width']}x{img['height']}px)")
+                return f"Found {len(images)} image(s) on page {page_num}. Use 'open image <number>' to view or 'analyze image <number>' to get details."
+            else:
+                return f"No images found on page {page_num}."
+        
+        elif action == "show_all_images":
+            self.image_handler.display_images_info()
+            return f"Displayed information for {len(self.image_handler.images)} images."
         
-        return prompt
+        elif action == "search_topic":
+            return self.report_topic_results(topic, self.image_handler.search_images_by_topic(topic))
+        
+        elif action == "open_and_analyze":
+            self.image_handler.open_image(page_num, analyze=True)
+            return ""
+        
+        elif action == "analyze_page":
+            images = self.image_handler.get_images_by_page(page_num)
+            if images:
+                logger.info(f"Analyzing {len(images)} image(s) on page {page_num}...")
+                # Descriptions are logged as each one finishes
+                for img, description in self.image_handler.analyze_images(images):
+                    logger.info(f"\n--- Image {img['index']}: {img['filename']} ---")
+                    logger.info(description)
+            else:
+                return f"No images found on page {page_num}."
+            return ""
+
+    def report_topic_results(self, topic, results):
+        if results:
+            logger.info(f"Found {len(results)} relevant image(s):")
+            for i, result in enumerate(results, 1):
+                img_info = result['info']
+                logger.info(f"\n{i}. Image {img_info['index']}: {img_info['filename']} (Page {img_info['page']})")
+                logger.info(f"   Analysis: {result['analysis'][:200]}...")
+            return f"Found {len(results)} images related to '{topic}'."
+        else:
+            return f"No images found related to '{topic}'."
 
-    def get_answer(self, query):
+    def prepare_answer(self, query):
         """
-        Mix general AI conversation + PDF-aware context + intelligent image handling.
+        Everything get_answer does for a text question short of calling the
+        LLM: classify the query, retrieve context and build the prompt.
+        Returns (kind, value, cache_slot): ("prompt", messages, slot) or
+        ("answer", text, None) when no LLM call is needed. A cache_slot
+        is passed to remember_answer once the LLM has answered.
         """
         query_lower = query.lower().strip()
-        
-        # Check for image-related queries
-        if any(word in query_lower for word in ["image", "picture", "photo", "diagram", "figure"]):
-            action, page_num, topic = parse_image_query(query)
-            
-            if action == "show_page_images":
-                images = self.image_handler.get_images_by_page(page_num)
-                if images:
-                    logger.info(f"Images on page {page_num}:")
-                    for img in images:
-                        logger.info(f"  {img['index']}. {img['filename']} ({img['format']}, {img['width']}x{img['height']}px)")
-                    return f"Found {len(images)} image(s) on page {page_num}. Use 'open image <number>' to view or 'analyze image <number>' to get details."
-                else:
-                    return f"No images found on page {page_num}."
-            
-            elif action == "show_all_images":
-                self.image_handler.display_images_info()
-                return f"Displayed information for {len(self.image_handler.images)} images."
-            
-            elif action == "search_topic":
-                results = self.image_handler.search_images_by_topic(topic)
-                if results:
-                    logger.info(f"Found {len(results)} relevant image(s):")
-                    for i, result in enumerate(results, 1):
-                        img_info = result['info']
-                        logger.info(f"\n{i}. Image {img_info['index']}: {img_info['filename']} (Page {img_info['page']})")
-                        logger.info(f"   Analysis: {result['analysis'][:200]}...")
-                    return f"Found {len(results)} images related to '{topic}'."
-                else:
-                    return f"No images found related to '{topic}'."
-            
-            elif action == "open_and_analyze":
-                self.image_handler.open_image(page_num, analyze=True)
-                return ""
-            
-            elif action == "analyze_page":
-                images = self.image_handler.get_images_by_page(page_num)
-                if images:
-                    logger.info(f"Analyzing {len(images)} image(s) on page {page_num}...")
-                    for img in images:
-                        logger.info(f"\n--- Image {img['index']}: {img['filename']} ---")
-                        description = self.image_handler.analyze_image_with_ollama(img['path'])
-                        logger.info(description)
-                else:
-                    return f"No images found on page {page_num}."
-                return ""
-        
+
         # Build PDF metadata context
         pdf_meta_context = (
             f"Document Name: '{self.pdf_info.get('file_name', 'Unknown')}'\n"
@@ -223,30 +563,146 @@ YOUR RESPONSE:"""
         if is_generic:
             # Simple greeting or conversation
             prompt = self.build_generic_prompt(query, pdf_meta_context)
-            return self.ollama_query(prompt)
+            return ("prompt", prompt, None)
         
         elif is_metadata_query:
             # Query about document metadata
             prompt = self.build_generic_prompt(query, pdf_meta_context)
-            return self.ollama_query(prompt)
+            return ("prompt", prompt, None)
         
         elif self.index is None or not self.chunks:
             # No content available
-            return f"This PDF appears to have no text content available for analysis. {pdf_meta_context}\nPlease ask about document metadata or upload a text-based PDF."
+            return ("answer", f"This PDF appears to have no text content available for analysis. {pdf_meta_context}\nPlease ask about document metadata or upload a text-based PDF.", None)
         
         else:
             # Content-based query - use RAG
-            query_embedding = model.encode([query])[0]
-            top_indices = search_index(self.index, query_embedding, TOP_K)
+            # Restrict the search to specific pages if the question names them,
+            # otherwise to this document unless searching the whole corpus
+            if self.search_scope == "corpus":
+                candidate_ids = None
+                lexical_docs = None
+            else:
+                candidate_ids = self.corpus.document_range(self.doc_id)
+                lexical_docs = [self.doc_id]
+            lexical_chunks = None
+            page_filter = parse_page_filter(query)
+            if page_filter:
+                first_page, last_page = page_filter
+                chunk_ids = sorted({
+                    chunk_id
+                    for page_num in range(first_page, last_page + 1)
+                    for chunk_id in self.page_index.get(page_num, [])
+                })
+                if not chunk_ids:
+                    if first_page == last_page:
+                        return ("answer", f"No text content found on page {first_page}.", None)
+                    return ("answer", f"No text content found on pages {first_page}-{last_page}.", None)
+                candidate_ids = self.corpus.vector_ids(self.doc_id, chunk_ids)
+                lexical_docs, lexical_chunks = [self.doc_id], {self.doc_id: chunk_ids}
+
+            query_embedding = embed_query(query)
+            cache_slot = self.answer_cache_slot(query, query_embedding, page_filter)
+            if cache_slot is not None:
+                cached = self.answer_cache.lookup(*cache_slot)
+                if cached is not None:
+                    return ("answer", cached, None)
+
+            hits = self.retrieve(query, query_embedding, candidate_ids, lexical_docs, lexical_chunks)
             
-            # Get relevant context chunks
-            context_chunks = [self.chunks[i] for i in top_indices]
-            context = "\n\n".join([f"[Excerpt {i+1}]:\n{chunk}" for i, chunk in enumerate(context_chunks)])
+            # Merge overlapping chunks, drop repeats and fit the token budget
+            excerpts, _ = pack_context(
+                [(doc_id, chunk) for (doc_id, _), chunk in self.resolve_hits(hits)],
+                context_token_budget(OLLAMA_MODEL),
+            )
+            context = "\n\n".join([
+                f"[Excerpt {i+1}, {self._source_label(doc_id, chunk)}]:\n{chunk.text}"
+                for i, (doc_id, chunk) in enumerate(excerpts)
+            ])
             
             # Build enhanced prompt
             prompt = self.build_enhanced_prompt(query, context, pdf_meta_context)
             
-            return self.ollama_query(prompt)
+            return ("prompt", prompt, cache_slot)
+
+    def get_answer(self, query, stream=False):
+        """
+        Mix general AI conversation + PDF-aware context + intelligent image handling.
+        With stream=True, answers generated by the LLM are returned as a
+        generator of text pieces; other answers are still plain strings.
+        """
+        action, page_num, topic = self.image_action(query)
+        if action:
+            return self.answer_image_query(action, page_num, topic)
+
+        kind, value, cache_slot = self.prepare_answer(query)
+        if kind == "prompt":
+            return self.remember_answer(cache_slot, self.ollama_query(value, stream=stream))
+        return value
+
+    def retrieve(self, query, query_embedding, candidate_ids, lexical_docs, lexical_chunks):
+        """
+        Find the TOP_K chunks for a question as (doc_id, chunk_id) pairs.
+        Dense and BM25 hits are fused in hybrid mode; with reranking on, a
+        wider candidate set is retrieved and reordered by the cross-encoder.
+        """
+        pool = RERANK_CANDIDATES if RERANK_ENABLED else TOP_K
+        if RETRIEVAL_MODE == "hybrid":
+            # Dense hits catch paraphrases, BM25 hits catch exact identifiers
+            per_retriever = max(HYBRID_CANDIDATES, pool)
+            dense = self.corpus.search(query_embedding, per_retriever, vector_ids=candidate_ids)
+            lexical = self.corpus.search_lexical(query, per_retriever, lexical_docs, lexical_chunks)
+            hits = reciprocal_rank_fusion([dense, lexical], RRF_K)[:pool]
+        else:
+            hits = self.corpus.search(query_embedding, pool, vector_ids=candidate_ids)
+
+        if RERANK_ENABLED and len(hits) > 1:
+            try:
+                candidates = [(hit, chunk.text) for hit, chunk in self.resolve_hits(hits)]
+                return rerank(query, candidates, TOP_K)
+            except Exception as e:
+                logger.warning(f"Reranking failed, keeping retrieval order: {e}")
+        return hits[:TOP_K]
+
+    def answer_cache_slot(self, query, query_embedding, page_filter):
+        """
+        Identify a content question for the answer cache: answers are only
+        shared between questions about the same document (or corpus
+        snapshot), model, API, prompt template, retrieval setup and page restriction.
+        Returns (key, normalized query, embedding), or None when caching is off.
+        """
+        if self.answer_cache is None:
+            return None
+        if self.search_scope == "corpus":
+            doc_ids = "|".join(sorted(self.corpus.documents))
+            scope = "corpus:" + hashlib.sha1(doc_ids.encode("utf-8")).hexdigest()
+        else:
+            scope = self.doc_id
+        key = (scope, OLLAMA_MODEL, OLLAMA_API, PROMPT_TEMPLATE_VERSION, RETRIEVAL_MODE, RERANK_ENABLED, page_filter)
+        return (key, normalize_query(query), query_embedding)
+
+    def remember_answer(self, cache_slot, answer):
+        """
+        Store a freshly generated answer in the answer cache. Streamed
+        answers are stored once they have been received in full without
+        a StreamError.
+        """
+        if cache_slot is None:
+            return answer
+        if isinstance(answer, str):
+            if answer.strip() and not answer.startswith(OLLAMA_ERROR_PREFIXES):
+                self.answer_cache.store(*cache_slot, answer)
+            return answer
+        return self._remember_stream(cache_slot, answer)
+
+    def _remember_stream(self, cache_slot, pieces):
+        received = []
+        failed = False
+        for piece in pieces:
+            received.append(piece)
+            failed = failed or isinstance(piece, StreamError)
+            yield piece
+        if not failed:
+            self.remember_answer(cache_slot, "".join(received))
 
     def start_chat(self):
         """
@@ -261,30 +717,7 @@ YOUR RESPONSE:"""
                 logger.error(f"File not found: {pdf_path}. Please enter a valid path.")
 
         # Build or load index
-        if not os.path.exists("embeddings/index.faiss"):
-            self.build_index(pdf_path)
-        else:
-            self.load_existing_index()
-            text = extract_text(pdf_path)
-
-            if not text or not text.strip():
-                logger.warning("No text detected. Switching to image-only mode.")
-                self.chunks, self.index = [], None
-            else:
-                self.chunks = chunk_text(text, CHUNK_SIZE, CHUNK_OVERLAP)
-
-            # Gather metadata
-            file_stats = os.stat(pdf_path)
-            reader = PdfReader(pdf_path)
-            self.pdf_info = {
-                "file_name": os.path.basename(pdf_path),
-                "page_count": len(reader.pages),
-                "file_size_kb": round(file_stats.st_size / 1024, 2),
-                "format": "PDF Document",
-            }
-
-            # Extract images
-            self.image_handler.extract_images_from_pdf(pdf_path)
+        self.load_pdf(pdf_path)
 
         logger.info(f"Loaded PDF: {self.pdf_info['file_name']} ({self.pdf_info['page_count']} pages, {self.pdf_info['file_size_kb']} KB)")
         if self.image_handler.images:
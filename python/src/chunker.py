@@ -1,10 +1,248 @@
-def chunk_text(text, chunk_size=500, overlap=100):
-    words = text.split()
+import re
+from bisect import bisect_right
+
+_WORD = re.compile(r"\S+")
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+
+
+class Chunk:
+    """
+    A chunk of document text plus where it came from.
+    Pages are 1-based and inclusive; char offsets index into the joined
+    document text produced by pdf_extractor.join_pages.
+    """
+    __slots__ = ("chunk_id", "text", "page_start", "page_end", "char_start", "char_end", "token_count")
+
+    def __init__(self, chunk_id, text, page_start, page_end, char_start, char_end, token_count):
+        self.chunk_id = chunk_id
+        self.text = text
+        self.page_start = page_start
+        self.page_end = page_end
+        self.char_start = char_start
+        self.char_end = char_end
+        self.token_count = token_count
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return (f"Chunk(id={self.chunk_id}, pages={self.page_start}-{self.page_end}, "
+                f"chars={self.char_start}-{self.char_end}, tokens={self.token_count})")
+
+    def covers_page(self, page_num):
+        return self.page_start <= page_num <= self.page_end
+
+
+def _make_chunk(chunk_id, window):
+    """
+    Build a Chunk from a window of (word, char_start, char_end, page) tuples.
+    """
+    return Chunk(
+        chunk_id,
+        " ".join(word for word, _, _, _ in window),
+        window[0][3],
+        window[-1][3],
+        window[0][1],
+        window[-1][2],
+        len(window),
+    )
+
+
+def _iter_words(pages, first_page=1, start_offset=0):
+    """
+    Yield (word, char_start, char_end, page) for every word in a page stream.
+    Offsets follow the same layout as pdf_extractor.join_pages.
+    """
+    page_offset = start_offset
+    for page_num, page_text in enumerate(pages, first_page):
+        if not page_text:
+            continue
+        for match in _WORD.finditer(page_text):
+            yield match.group(), page_offset + match.start(), page_offset + match.end(), page_num
+        page_offset += len(page_text) + 1
+
+
+def iter_chunks(pages, chunk_size=500, overlap=100, first_page=1, start_offset=0, first_chunk_id=0):
+    """
+    Chunk a stream of page texts into overlapping word windows.
+    Only the words of the current window are held in memory, so chunks
+    are emitted while later pages are still being extracted.
+    first_page, start_offset and first_chunk_id place a partial page
+    stream (e.g. re-indexed pages) within the whole document.
+    """
+    step = chunk_size - overlap
+    window = []
+    pending = 0  # words in the window that no emitted chunk covers yet
+    chunk_id = first_chunk_id
+    for word in _iter_words(pages, first_page, start_offset):
+        window.append(word)
+        pending += 1
+        if len(window) == chunk_size:
+            yield _make_chunk(chunk_id, window)
+            chunk_id += 1
+            del window[:step]
+            pending = 0
+    if pending:
+        yield _make_chunk(chunk_id, window)
+
+
+def _iter_sentences(page_text):
+    """
+    Yield (sentence, start, end) spans of a page, split at sentence-ending
+    punctuation and blank lines.
+    """
+    start = 0
+    for match in _SENTENCE_END.finditer(page_text):
+        yield from _stripped_span(page_text, start, match.end())
+        start = match.end()
+    yield from _stripped_span(page_text, start, len(page_text))
+
+
+def _stripped_span(text, start, end):
+    span = text[start:end]
+    stripped = span.strip()
+    if stripped:
+        start += len(span) - len(span.lstrip())
+        yield stripped, start, start + len(stripped)
+
+
+def _iter_token_pieces(pages, tokenizer, max_tokens, first_page=1, start_offset=0):
+    """
+    Yield (text, char_start, char_end, page, token_count) pieces: whole
+    sentences, or token-sized slices of sentences longer than max_tokens.
+    All sentences of a page are tokenized in a single batched call.
+    """
+    page_offset = start_offset
+    for page_num, page_text in enumerate(pages, first_page):
+        if not page_text:
+            continue
+        sentences = list(_iter_sentences(page_text))
+        if sentences:
+            encoded = tokenizer(
+                [sentence for sentence, _, _ in sentences],
+                add_special_tokens=False,
+                return_offsets_mapping=True,
+            )
+            for (sentence, start, end), offsets in zip(sentences, encoded["offset_mapping"]):
+                if len(offsets) <= max_tokens:
+                    yield " ".join(sentence.split()), page_offset + start, page_offset + end, page_num, len(offsets)
+                    continue
+                for i in range(0, len(offsets), max_tokens):
+                    piece = offsets[i:i + max_tokens]
+                    piece_start, piece_end = start + piece[0][0], start + piece[-1][1]
+                    yield (" ".join(page_text[piece_start:piece_end].split()),
+                           page_offset + piece_start, page_offset + piece_end, page_num, len(piece))
+        page_offset += len(page_text) + 1
+
+
+def iter_token_chunks(pages, tokenizer, max_tokens=254, overlap=32, first_page=1, start_offset=0, first_chunk_id=0):
+    """
+    Chunk a stream of page texts into windows of at most max_tokens
+    tokenizer tokens, breaking only at sentence boundaries. Up to `overlap`
+    tokens of trailing sentences are repeated at the start of the next chunk.
+    """
+    window = []
+    window_tokens = 0
+    pending = False  # whether the window holds text no emitted chunk covers yet
+    chunk_id = first_chunk_id
+    for piece in _iter_token_pieces(pages, tokenizer, max_tokens, first_page, start_offset):
+        piece_tokens = piece[4]
+        if window and window_tokens + piece_tokens > max_tokens:
+            if pending:
+                yield _make_token_chunk(chunk_id, window)
+                chunk_id += 1
+                pending = False
+            kept, kept_tokens = [], 0
+            for previous in reversed(window):
+                if kept_tokens + previous[4] > overlap or kept_tokens + previous[4] + piece_tokens > max_tokens:
+                    break
+                kept.insert(0, previous)
+                kept_tokens += previous[4]
+            window, window_tokens = kept, kept_tokens
+        window.append(piece)
+        window_tokens += piece_tokens
+        pending = True
+    if pending:
+        yield _make_token_chunk(chunk_id, window)
+
+
+def _make_token_chunk(chunk_id, window):
+    return Chunk(
+        chunk_id,
+        " ".join(piece[0] for piece in window),
+        window[0][3],
+        window[-1][3],
+        window[0][1],
+        window[-1][2],
+        sum(piece[4] for piece in window),
+    )
+
+
+def chunk_text(text, chunk_size=500, overlap=100, page_offsets=None):
+    """
+    Chunk already-joined document text into Chunk records.
+    Pass the page_offsets from pdf_extractor.join_pages to get page numbers;
+    without them every chunk is attributed to page 1.
+    """
+    page_offsets = page_offsets or [0]
+    words = [
+        (m.group(), m.start(), m.end(), bisect_right(page_offsets, m.start()))
+        for m in _WORD.finditer(text)
+    ]
     chunks = []
     start = 0
     while start < len(words):
         end = min(start + chunk_size, len(words))
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk)
+        chunks.append(_make_chunk(len(chunks), words[start:end]))
         start += chunk_size - overlap
     return chunks
+
+
+def rebase_chunk(chunk, old_page_offsets, new_page_offsets):
+    """
+    Copy of `chunk` with char offsets moved to a new page layout, for chunks
+    whose pages are unchanged but earlier pages changed length.
+    Offset lists are 0-based by page (index 0 is page 1).
+    """
+    start_shift = new_page_offsets[chunk.page_start - 1] - old_page_offsets[chunk.page_start - 1]
+    end_shift = new_page_offsets[chunk.page_end - 1] - old_page_offsets[chunk.page_end - 1]
+    return Chunk(chunk.chunk_id, chunk.text, chunk.page_start, chunk.page_end,
+                 chunk.char_start + start_shift, chunk.char_end + end_shift, chunk.token_count)
+
+
+def page_offsets_from_lengths(page_lengths):
+    """
+    Start offset of every page in the joined document text, given the
+    length of each page's text (see pdf_extractor.join_pages).
+    """
+    offsets = []
+    position = 0
+    for length in page_lengths:
+        offsets.append(position)
+        if length:
+            position += length + 1
+    return offsets
+
+
+def contiguous_runs(pages):
+    """
+    Group page numbers into sorted (first, last) runs of consecutive pages.
+    """
+    runs = []
+    for page in sorted(pages):
+        if runs and page == runs[-1][1] + 1:
+            runs[-1][1] = page
+        else:
+            runs.append([page, page])
+    return [tuple(run) for run in runs]
+
+
+def build_page_index(chunks):
+    """
+    Map each page number to the ids of the chunks that cover it.
+    """
+    page_index = {}
+    for chunk in chunks:
+        for page_num in range(chunk.page_start, chunk.page_end + 1):
+            page_index.setdefault(page_num, []).append(chunk.chunk_id)
+    return page_index
@@ -1,17 +1,111 @@
 # src/config.py
 
+# ========================================
+# PDF EXTRACTION
+# ========================================
+EXTRACT_BACKEND = "pypdf2"  # "pypdf2" or "pymupdf" (faster, usually cleaner text)
+EXTRACT_WORKERS = None  # Worker processes for page extraction (None = one per CPU core)
+EXTRACT_MIN_PAGES_PER_SHARD = 16  # Small PDFs are extracted in-process
+IMAGE_MIN_SIZE = 32  # Images narrower or shorter than this many pixels are skipped as decoration
+IMAGE_WRITE_WORKERS = 4  # Threads writing extracted image files
+
 # ========================================
 # TEXT PROCESSING
 # ========================================
-CHUNK_SIZE = 500
+CHUNK_MODE = "tokens"  # "tokens" (embedding tokenizer, sentence-aligned) or "words"
+CHUNK_SIZE = 500  # Words per chunk in "words" mode
 CHUNK_OVERLAP = 50
+CHUNK_TOKENS = None  # Tokens per chunk in "tokens" mode (None = embedding model window)
+CHUNK_TOKEN_OVERLAP = 32
 TOP_K = 3
 
+# ========================================
+# EMBEDDINGS
+# ========================================
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBED_ENCODE_BATCH_SIZE = 64  # Sentences per forward pass
+EMBED_PROCESSES = 1  # CPU encode worker processes (None = one per core)
+EMBED_CACHE_ENABLED = True  # Reuse embeddings of previously seen chunks
+EMBED_CACHE_DIR = "embeddings/cache"
+EMBED_CACHE_DTYPE = "float16"  # "float16" halves disk use; "float32" is exact
+EMBED_CACHE_MAX_ENTRIES = 200000  # Least recently used chunks are evicted past this
+QUERY_CACHE_MAX_ENTRIES = 1024  # Recent question embeddings kept in memory
+
+# ========================================
+# VECTOR INDEX
+# ========================================
+CORPUS_DIR = "embeddings/corpus"  # Shared index, catalog and per-document chunk stores
+INCREMENTAL_MAX_CHANGED_FRACTION = 0.5  # Above this share of changed pages, re-uploads rebuild fully
+RETRIEVAL_SCOPE = "document"  # "document" (current PDF only) or "corpus" (every indexed PDF)
+INDEX_TYPE = "auto"  # "flat", "ivf_flat", "ivf_pq" or "auto" (by corpus size); "hnsw" only outside the corpus
+INDEX_AUTO_THRESHOLDS = {"ivf_flat": 20000, "ivf_pq": 500000}  # Vector counts where auto switches type
+INDEX_NPROBE = 16  # IVF lists scanned per query (higher = better recall, slower)
+INDEX_EF_SEARCH = 64  # HNSW candidate list size per query
+INDEX_HNSW_M = 32  # HNSW graph degree
+INDEX_PQ_M = 48  # PQ sub-quantizers (rounded down to a divisor of the dimension)
+
+# ========================================
+# HYBRID RETRIEVAL
+# ========================================
+RETRIEVAL_MODE = "hybrid"  # "hybrid" (BM25 + vectors, fused by rank) or "vector"
+HYBRID_CANDIDATES = 20  # Hits taken from each retriever before fusion
+BM25_K1 = 1.2  # Term-frequency saturation
+BM25_B = 0.75  # Chunk-length normalization
+RRF_K = 60  # Reciprocal rank fusion damping (higher = flatter)
+
+# ========================================
+# RERANKING
+# ========================================
+RERANK_ENABLED = False  # Rerank a wider candidate set with a cross-encoder before taking TOP_K
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"  # Small enough for CPU
+RERANK_CANDIDATES = 50  # Candidates retrieved for reranking
+RERANK_BATCH_SIZE = 32  # (query, chunk) pairs per forward pass
+RERANK_CACHE_MAX_ENTRIES = 20000  # Recent (query, chunk) scores kept in memory
+
+# ========================================
+# CONTEXT PACKING
+# ========================================
+CONTEXT_TOKEN_BUDGETS = {"default": 1500}  # Retrieved-context tokens per prompt, by OLLAMA_MODEL name
+CONTEXT_CHARS_PER_TOKEN = 4  # For estimating LLM tokens without the model's tokenizer
+CONTEXT_DEDUP_THRESHOLD = 0.8  # Excerpts this similar (word-trigram Jaccard) to a better one are dropped
+CONTEXT_MIN_EXCERPT_TOKENS = 64  # Don't truncate an excerpt to fewer tokens than this
+
+# ========================================
+# INGEST PIPELINE
+# ========================================
+EMBED_BATCH_SIZE = 256  # Chunks handed to the embedder per pipeline batch
+PIPELINE_QUEUE_SIZE = 4  # Max items buffered between pipeline stages
+
 # ========================================
 # TEXT MODEL (for conversations & Q&A)
 # ========================================
 OLLAMA_MODEL = "llama3.2"
-OLLAMA_URL = "http://localhost:11434/v1/completions"
+OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_API = "chat"  # "chat" (/api/chat, reuses the cached prompt prefix) or "completions" (/v1/completions)
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps the model and its prompt cache loaded after a chat ("-1" = forever)
+
+# ========================================
+# OLLAMA CONNECTION
+# ========================================
+OLLAMA_TIMEOUTS = {  # (connect, read) seconds per endpoint
+    "completions": (5, 300),
+    "chat": (5, 300),
+    "generate": (5, 60),
+    "tags": (3, 10),
+    "default": (5, 60),
+}
+OLLAMA_POOL_SIZE = 8  # Keep-alive connections kept open to Ollama
+OLLAMA_RETRIES = 2  # Retries on connection errors and 502/503/504
+OLLAMA_RETRY_BACKOFF = 0.5  # Seconds; doubles on each retry
+
+# ========================================
+# ANSWER CACHE
+# ========================================
+PROMPT_TEMPLATE_VERSION = 3  # Bump when the prompt builders change so older cached answers are dropped
+ANSWER_CACHE_ENABLED = True  # Reuse answers to repeated questions about the same document
+ANSWER_CACHE_THRESHOLD = 0.95  # Cosine similarity at which a question counts as a near-duplicate
+ANSWER_CACHE_TTL = 24 * 3600  # Seconds a cached answer stays valid
+ANSWER_CACHE_MAX_ENTRIES = 1000  # Least recently used answers are evicted past this
 
 # ========================================
 # VISION MODEL (for image analysis)
@@ -44,6 +138,28 @@ AVAILABLE_VISION_MODELS = {
     }
 }
 
+# ========================================
+# VISION SCHEDULER
+# ========================================
+VISION_MAX_IN_FLIGHT = 2  # Concurrent vision calls; match Ollama's OLLAMA_NUM_PARALLEL
+VISION_PRECAPTION = False  # Describe every image in the background after indexing (fills the vision cache)
+
+# ========================================
+# VISION CACHE
+# ========================================
+VISION_CACHE_ENABLED = True  # Reuse vision answers for the same image bytes, model and prompt
+VISION_CACHE_DIR = "data/vision_cache"
+VISION_CACHE_MAX_ENTRIES = 5000  # Least recently used answers are evicted past this
+
+# ========================================
+# IMAGE SEARCH
+# ========================================
+IMAGE_INDEX_ENABLED = True  # Embed images at extraction so topic search is one vector search
+IMAGE_EMBEDDING_MODEL = "clip-ViT-B-32"  # CLIP model embedding images and text together
+IMAGE_EMBED_BATCH_SIZE = 32
+IMAGE_SEARCH_TOP_K = 5  # Most images returned for a topic
+IMAGE_SEARCH_MIN_SCORE = 0.22  # CLIP text-image cosine below which an image is not a match
+
 # ========================================
 # MODEL SWITCHING
 # ========================================
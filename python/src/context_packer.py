@@ -0,0 +1,153 @@
+import math
+import threading
+from src.chunker import Chunk
+from src.config import (
+    CONTEXT_TOKEN_BUDGETS, CONTEXT_CHARS_PER_TOKEN, CONTEXT_DEDUP_THRESHOLD, CONTEXT_MIN_EXCERPT_TOKENS
+)
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+_stats = {"queries": 0, "tokens_before": 0, "tokens_after": 0}
+_stats_lock = threading.Lock()
+
+# Chunks whose char ranges are at most this far apart are joined
+ADJACENT_GAP = 2
+
+
+def estimate_tokens(text, chars_per_token=CONTEXT_CHARS_PER_TOKEN):
+    """
+    Rough LLM token count of a text. The Ollama model's tokenizer is not
+    available locally, and a chars-per-token ratio is close enough for
+    budgeting.
+    """
+    return math.ceil(len(text) / chars_per_token)
+
+
+def context_token_budget(model_name):
+    return CONTEXT_TOKEN_BUDGETS.get(model_name, CONTEXT_TOKEN_BUDGETS["default"])
+
+
+def _overlap_words(first_words, second_words):
+    """
+    Length of the longest suffix of first_words that starts second_words.
+    """
+    for k in range(min(len(first_words), len(second_words)), 0, -1):
+        if first_words[-k:] == second_words[:k]:
+            return k
+    return 0
+
+
+def merge_chunks(first, second):
+    """
+    Join two chunks of one document whose char ranges overlap or touch
+    (second starting no earlier than first). Returns the merged Chunk, or
+    None if they are apart.
+    """
+    if second.char_start > first.char_end + ADJACENT_GAP:
+        return None
+    if second.char_end <= first.char_end:
+        return first
+    first_words, second_words = first.text.split(), second.text.split()
+    overlap = _overlap_words(first_words, second_words) if second.char_start < first.char_end else 0
+    new_words = second_words[overlap:]
+    token_count = first.token_count + round(second.token_count * len(new_words) / max(len(second_words), 1))
+    return Chunk(first.chunk_id, " ".join(first_words + new_words), first.page_start,
+                 max(first.page_end, second.page_end), first.char_start, second.char_end, token_count)
+
+
+def _shingles(text, size=3):
+    words = text.lower().split()
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def _truncate(text, max_tokens):
+    """
+    Cut a text to about max_tokens at a word boundary.
+    """
+    cut = text[:max_tokens * CONTEXT_CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+    return cut + " ..."
+
+
+def pack_context(hits, token_budget, dedup_threshold=CONTEXT_DEDUP_THRESHOLD):
+    """
+    Turn retrieved (doc_id, chunk) pairs, best first, into the excerpts
+    that go into the prompt.
+
+    Overlapping or adjacent chunks of a document are merged into one
+    excerpt, so the text they share appears once. Excerpts that are
+    near-duplicates of a more relevant one (word-shingle Jaccard similarity
+    of at least dedup_threshold) are dropped. The rest fill token_budget in
+    relevance order, with the last one truncated if it fits only in part.
+    Excerpts are returned in document and page order, together with a
+    stats dict of estimated prompt tokens before and after packing.
+    """
+    # Merge runs of touching chunks within each document
+    ranks = {}
+    by_doc = {}
+    for rank, (doc_id, chunk) in enumerate(hits):
+        ranks[(doc_id, chunk.chunk_id)] = rank
+        by_doc.setdefault(doc_id, []).append(chunk)
+    blocks = []  # (best rank, doc_id, chunk)
+    for doc_id, chunks in by_doc.items():
+        chunks.sort(key=lambda chunk: chunk.char_start)
+        current, best = chunks[0], ranks[(doc_id, chunks[0].chunk_id)]
+        for chunk in chunks[1:]:
+            merged = merge_chunks(current, chunk)
+            if merged is None:
+                blocks.append((best, doc_id, current))
+                current, best = chunk, ranks[(doc_id, chunk.chunk_id)]
+            else:
+                current, best = merged, min(best, ranks[(doc_id, chunk.chunk_id)])
+        blocks.append((best, doc_id, current))
+    blocks.sort(key=lambda block: block[0])
+
+    kept, kept_shingles = [], []
+    merged_count = len(hits) - len(blocks)
+    duplicates = truncated = 0
+    remaining = token_budget
+    for rank, doc_id, chunk in blocks:
+        shingles = _shingles(chunk.text)
+        if any(len(shingles & other) / len(shingles | other) >= dedup_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        tokens = estimate_tokens(chunk.text)
+        if tokens > remaining:
+            if remaining < CONTEXT_MIN_EXCERPT_TOKENS:
+                continue
+            chunk = Chunk(chunk.chunk_id, _truncate(chunk.text, remaining), chunk.page_start, chunk.page_end,
+                          chunk.char_start, chunk.char_end, chunk.token_count)
+            tokens = estimate_tokens(chunk.text)
+            truncated += 1
+        remaining -= tokens
+        kept.append((rank, doc_id, chunk))
+        kept_shingles.append(shingles)
+
+    doc_order = {}
+    for rank, doc_id, _ in blocks:
+        doc_order.setdefault(doc_id, rank)
+    kept.sort(key=lambda block: (doc_order[block[1]], block[2].page_start, block[2].char_start))
+
+    stats = {
+        "tokens_before": sum(estimate_tokens(chunk.text) for _, chunk in hits),
+        "tokens_after": token_budget - remaining,
+        "merged": merged_count,
+        "duplicates": duplicates,
+        "truncated": truncated,
+    }
+    with _stats_lock:
+        _stats["queries"] += 1
+        _stats["tokens_before"] += stats["tokens_before"]
+        _stats["tokens_after"] += stats["tokens_after"]
+    logger.info(f"Packed {len(hits)} chunks into {len(kept)} excerpts: ~{stats['tokens_after']} context tokens, "
+                f"{stats['tokens_before'] - stats['tokens_after']} saved ({merged_count} merged, "
+                f"{duplicates} near-duplicates, {truncated} truncated)")
+    return [(doc_id, chunk) for _, doc_id, chunk in kept], stats
+
+
+def get_packing_stats():
+    """
+    Estimated context tokens before and after packing, summed over queries.
+    """
+    with _stats_lock:
+        return dict(_stats, tokens_saved=_stats["tokens_before"] - _stats["tokens_after"])
@@ -0,0 +1,437 @@
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+import faiss
+import numpy as np
+from filelock import FileLock
+from src.doc_store import save_doc_store, load_doc_store
+from src.vector_store import (
+    create_index, save_index, load_index, search_index, resolve_index_type, index_kind, index_contents
+)
+from src.lexical_index import LexicalIndex, search_lexical
+from src.config import CORPUS_DIR, INDEX_TYPE
+from src.utils import setup_logging, save_metadata, load_metadata
+
+logger = setup_logging()
+
+CHUNK_ID_BITS = 32
+
+
+def make_vector_id(doc_num, chunk_id):
+    """
+    Pack a document number and chunk id into one 64-bit FAISS id.
+    """
+    return (doc_num << CHUNK_ID_BITS) | chunk_id
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def split_vector_id(vector_id):
+    """
+    Inverse of make_vector_id: returns (doc_num, chunk_id).
+    """
+    vector_id = int(vector_id)
+    return vector_id >> CHUNK_ID_BITS, vector_id & ((1 << CHUNK_ID_BITS) - 1)
+
+
+class Corpus:
+    """
+    A persistent collection of indexed PDFs.
+
+    All documents share one IndexIDMap2; each vector id encodes
+    (document number, chunk id), so a single FAISS search covers every
+    document and results map straight back to their chunks. Each document
+    keeps its own document store and BM25 index under docs/<doc_id>/.
+
+    Changes hold a thread lock and a file lock on the corpus directory, and
+    start by reloading the catalog and index if another process saved them,
+    so concurrent writers never hand out the same document number or
+    overwrite each other's documents. Use get_corpus() to share one Corpus
+    per process.
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        self.index_path = os.path.join(corpus_dir, "corpus.faiss")
+        self.catalog_path = os.path.join(corpus_dir, "catalog.json")
+        os.makedirs(corpus_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(os.path.join(corpus_dir, "corpus.lock"))
+        self._stamp = False  # (mtime, size) of the catalog last read; False = never read
+        self.catalog = None
+        self.index = None
+        self._tables = {}
+        self._lexical = {}
+        self._doc_ids_by_num = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Reload the catalog and index if they were saved by someone else
+        since this Corpus last read or wrote them.
+        """
+        with self._lock:
+            stamp = _file_stamp(self.catalog_path)
+            if stamp == self._stamp:
+                return
+            self.catalog = load_metadata(self.catalog_path) or {"next_doc_num": 0, "documents": {}}
+            self.index = load_index(self.index_path)
+            self._doc_ids_by_num = None
+            self._stamp = stamp
+            for cache in (self._tables, self._lexical):
+                for doc_id in [doc_id for doc_id in cache if doc_id not in self.documents]:
+                    del cache[doc_id]
+
+    @contextmanager
+    def _writing(self):
+        """
+        Hold the thread and file locks around a change, starting from the
+        latest saved state, and save once the change is made.
+        """
+        with self._lock, self._file_lock:
+            self.refresh()
+            try:
+                yield
+            except BaseException:
+                self._stamp = False  # drop the half-made change on the next refresh
+                raise
+            self.save()
+
+    @property
+    def documents(self):
+        return self.catalog["documents"]
+
+    def has_document(self, doc_id):
+        return doc_id in self.documents
+
+    def document_dir(self, doc_id):
+        return os.path.join(self.corpus_dir, "docs", doc_id)
+
+    def doc_num(self, doc_id):
+        return self.documents[doc_id]["doc_num"]
+
+    def vector_ids(self, doc_id, chunk_ids):
+        doc_num = self.doc_num(doc_id)
+        return [make_vector_id(doc_num, chunk_id) for chunk_id in chunk_ids]
+
+    def document_range(self, doc_id):
+        """
+        All possible vector ids of a document, for restricting a search to it.
+        """
+        doc_num = self.doc_num(doc_id)
+        return range(make_vector_id(doc_num, 0), make_vector_id(doc_num + 1, 0))
+
+    def _doc_id_for_num(self, doc_num):
+        if self._doc_ids_by_num is None:
+            self._doc_ids_by_num = {entry["doc_num"]: doc_id for doc_id, entry in self.documents.items()}
+        return self._doc_ids_by_num.get(doc_num)
+
+    def add_vectors(self, vector_ids, embeddings):
+        """
+        Add embeddings under explicit vector ids, creating the index if needed.
+        """
+        if self.index is None:
+            self.index = create_index(embeddings, "flat", ids=vector_ids)
+        else:
+            self.index.add_with_ids(
+                np.ascontiguousarray(embeddings, dtype=np.float32),
+                np.asarray(vector_ids, dtype=np.int64),
+            )
+
+    def remove_vectors(self, vector_ids):
+        if self.index is not None and len(vector_ids):
+            self.index.remove_ids(faiss.IDSelectorBatch(np.asarray(vector_ids, dtype=np.int64)))
+
+    def add_document(self, doc_id, batches, pdf_info, images, page_fingerprints=None, page_lengths=None,
+                     replaces=None):
+        """
+        Index a document from a stream of (chunks, embeddings) batches and
+        persist its document store. Any previous copy of doc_id is replaced,
+        and so is the document `replaces` (an older revision), if given.
+        Returns the document's chunks as a ChunkTable.
+        """
+        # Extraction and embedding run before taking the locks; embeddings
+        # are spilled to disk as they arrive so memory stays flat
+        with tempfile.TemporaryFile(dir=self.corpus_dir) as spill_file:
+            chunks, sizes = _spill(batches, spill_file)
+            self._add_document(doc_id, chunks, _read_spilled(spill_file, chunks, sizes), pdf_info, images,
+                               page_fingerprints, page_lengths, replaces)
+        logger.info(f"Added {pdf_info.get('file_name')} to the corpus ({len(chunks)} chunks, "
+                    f"{len(self.documents)} documents total).")
+        return self.load_document(doc_id)[0]
+
+    def _add_document(self, doc_id, chunks, batches, pdf_info, images, page_fingerprints, page_lengths, replaces):
+        with self._writing():
+            for old_id in (doc_id, replaces):
+                if old_id is not None and self.has_document(old_id):
+                    self._remove_document(old_id)
+
+            doc_num = self.catalog["next_doc_num"]
+            self.catalog["next_doc_num"] += 1
+            self.documents[doc_id] = {"doc_num": doc_num, "file_name": pdf_info.get("file_name"),
+                                      "chunk_count": len(chunks)}
+            self._doc_ids_by_num = None
+            for batch, embeddings in batches:
+                self.add_vectors([make_vector_id(doc_num, chunk.chunk_id) for chunk in batch], embeddings)
+
+            save_doc_store(self.document_dir(doc_id), chunks, pdf_info, images, doc_id,
+                           page_fingerprints, page_lengths)
+            self._save_lexical_index(doc_id, chunks)
+            self._maybe_optimize()
+
+    def update_document(self, old_doc_id, new_doc_id, stale_chunk_ids, kept_chunks, batches,
+                        pdf_info, images, page_fingerprints, page_lengths):
+        """
+        Apply an incremental re-index: drop the vectors of stale chunks, add
+        the re-embedded ones from `batches`, and store the revision under
+        its new content hash. The document keeps its number, so vector ids
+        of unchanged chunks stay valid. kept_chunks is only iterated after
+        batches is exhausted. Returns the new ChunkTable, or None if the old
+        version left the corpus in the meantime.
+        """
+        with tempfile.TemporaryFile(dir=self.corpus_dir) as spill_file:
+            added, sizes = _spill(batches, spill_file)
+            chunks = added + list(kept_chunks)
+            chunks.sort(key=lambda chunk: (chunk.page_start, chunk.char_start, chunk.chunk_id))
+            updated = self._update_document(old_doc_id, new_doc_id, stale_chunk_ids, chunks,
+                                            _read_spilled(spill_file, added, sizes), pdf_info, images,
+                                            page_fingerprints, page_lengths)
+        if not updated:
+            return None
+        logger.info(f"Updated {pdf_info.get('file_name')} in place: removed {len(stale_chunk_ids)} "
+                    f"stale chunks, added {len(added)}.")
+        return self.load_document(new_doc_id)[0]
+
+    def _update_document(self, old_doc_id, new_doc_id, stale_chunk_ids, chunks, batches,
+                         pdf_info, images, page_fingerprints, page_lengths):
+        with self._writing():
+            entry = self.documents.pop(old_doc_id, None)
+            if entry is None:
+                logger.warning(f"{pdf_info.get('file_name')} was removed from the corpus during the update.")
+                return False
+            self.documents[new_doc_id] = entry
+            self._doc_ids_by_num = None
+            self._tables.pop(old_doc_id, None)
+
+            self.remove_vectors([make_vector_id(entry["doc_num"], chunk_id) for chunk_id in stale_chunk_ids])
+            for batch, embeddings in batches:
+                self.add_vectors([make_vector_id(entry["doc_num"], chunk.chunk_id) for chunk in batch], embeddings)
+
+            entry["file_name"] = pdf_info.get("file_name")
+            entry["chunk_count"] = len(chunks)
+            save_doc_store(self.document_dir(new_doc_id), chunks, pdf_info, images, new_doc_id,
+                           page_fingerprints, page_lengths)
+            self._lexical.pop(old_doc_id, None)
+            self._save_lexical_index(new_doc_id, chunks)
+            shutil.rmtree(self.document_dir(old_doc_id), ignore_errors=True)
+            self._maybe_optimize()
+        return True
+
+    def find_previous_version(self, file_name, doc_id):
+        """
+        Most recently added document with the same file name but different
+        content, i.e. the version a re-upload is revising.
+        """
+        candidates = [
+            (entry["doc_num"], other_id)
+            for other_id, entry in self.documents.items()
+            if entry.get("file_name") == file_name and other_id != doc_id
+        ]
+        return max(candidates)[1] if candidates else None
+
+    def remove_document(self, doc_id):
+        """
+        Drop a document's vectors and store without touching other documents.
+        """
+        with self._writing():
+            self._remove_document(doc_id)
+
+    def _remove_document(self, doc_id):
+        entry = self.documents.pop(doc_id, None)
+        if entry is None:
+            return
+        self._doc_ids_by_num = None
+        if self.index is not None:
+            first = make_vector_id(entry["doc_num"], 0)
+            removed = self.index.remove_ids(faiss.IDSelectorRange(first, make_vector_id(entry["doc_num"] + 1, 0)))
+            logger.info(f"Removed {removed} vectors for {entry.get('file_name')} from the corpus.")
+        self._tables.pop(doc_id, None)
+        self._lexical.pop(doc_id, None)
+        shutil.rmtree(self.document_dir(doc_id), ignore_errors=True)
+
+    def load_document(self, doc_id):
+        """
+        Open a document's store. Returns (chunks, manifest) or None if it is
+        not in the corpus or its store is stale; a stale document is dropped
+        from the corpus, so its vectors and BM25 index stop matching.
+        """
+        if not self.has_document(doc_id):
+            return None
+        stored = load_doc_store(self.document_dir(doc_id), doc_id)
+        if stored is None:
+            self._drop_stale(doc_id)
+            return None
+        self._tables[doc_id] = stored[0]
+        return stored
+
+    def _drop_stale(self, doc_id):
+        with self._writing():
+            # Another process may have re-indexed it in the meantime
+            if self.has_document(doc_id) and load_doc_store(self.document_dir(doc_id), doc_id) is None:
+                logger.warning(f"The stored chunks of {self.documents[doc_id].get('file_name')} no longer "
+                               f"match the current settings; removed it from the corpus. Upload it again "
+                               f"to re-index it.")
+                self._remove_document(doc_id)
+
+    def get_chunk(self, doc_id, chunk_id):
+        if doc_id not in self._tables:
+            stored = self.load_document(doc_id)
+            if stored is None:
+                return None
+        return self._tables[doc_id].get(chunk_id)
+
+    def _save_lexical_index(self, doc_id, chunks):
+        index = LexicalIndex.build(chunks)
+        index.save(self.document_dir(doc_id))
+        self._lexical[doc_id] = index
+
+    def lexical_index(self, doc_id):
+        """
+        A document's BM25 index, loaded from its store on first use.
+        """
+        index = self._lexical.get(doc_id)
+        if index is None:
+            index = LexicalIndex.load(self.document_dir(doc_id))
+            if index is not None:
+                self._lexical[doc_id] = index
+        return index
+
+    def search_lexical(self, query, top_k=3, doc_ids=None, chunk_ids=None):
+        """
+        BM25 search over `doc_ids` (default: every document), optionally
+        limited to a {doc_id: chunk ids} mapping. Term statistics span all
+        searched documents, so scores are comparable across them.
+        Returns a list of (doc_id, chunk_id) pairs, best first.
+        """
+        self.refresh()
+        indexes = {}
+        for doc_id in (list(self.documents) if doc_ids is None else doc_ids):
+            index = self.lexical_index(doc_id)
+            if index is not None:
+                indexes[doc_id] = index
+        return [(doc_id, chunk_id) for doc_id, chunk_id, _ in search_lexical(indexes, query, top_k, chunk_ids)]
+
+    def search(self, query_embedding, top_k=3, vector_ids=None):
+        """
+        Search every document in one FAISS call, or only `vector_ids`.
+        Returns a list of (doc_id, chunk_id) pairs, best first.
+        """
+        with self._lock:
+            self.refresh()
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            results = []
+            for vector_id in search_index(self.index, query_embedding, top_k, ids=vector_ids):
+                doc_num, chunk_id = split_vector_id(vector_id)
+                doc_id = self._doc_id_for_num(doc_num)
+                if doc_id is not None:
+                    results.append((doc_id, chunk_id))
+            return results
+
+    def target_index_type(self):
+        """
+        The index type the corpus should have at its current size: INDEX_TYPE,
+        or the auto choice by vector count. HNSW is never used, because an
+        IndexIDMap2 over HNSW cannot remove ids, which removing and updating
+        documents needs.
+        """
+        index_type = INDEX_TYPE
+        if index_type == "hnsw":
+            index_type = "auto"
+        return resolve_index_type(index_type, self.index.ntotal if self.index is not None else 0)
+
+    def _maybe_optimize(self):
+        if self.index is not None and self.index.ntotal and index_kind(self.index) != self.target_index_type():
+            self._rebuild(self.target_index_type())
+
+    def _rebuild(self, index_type):
+        ids, vectors = index_contents(self.index)
+        logger.info(f"Rebuilding the corpus index with {len(ids)} vectors as {index_type}.")
+        self.index = create_index(vectors, index_type, ids=ids)
+
+    def optimize(self, index_type=None):
+        """
+        Rebuild the shared index as another type (default: the one suited to
+        the corpus size), keeping every vector id. Runs automatically when
+        documents push the corpus past an INDEX_AUTO_THRESHOLDS size.
+        """
+        if index_type == "hnsw":
+            raise ValueError("The corpus cannot use hnsw: it does not support removing documents.")
+        with self._writing():
+            if self.index is not None and self.index.ntotal:
+                self._rebuild(index_type or self.target_index_type())
+
+    def save(self):
+        """
+        Write the index, then the catalog, each replacing its file in one
+        step so readers never see a partial file.
+        """
+        with self._lock:
+            if self.index is not None:
+                save_index(self.index, self.index_path + ".tmp")
+                os.replace(self.index_path + ".tmp", self.index_path)
+            save_metadata(self.catalog, self.catalog_path + ".tmp")
+            os.replace(self.catalog_path + ".tmp", self.catalog_path)
+            self._stamp = _file_stamp(self.catalog_path)
+
+
+def _spill(batches, spill_file):
+    """
+    Drain a stream of (chunks, embeddings) batches, appending the embeddings
+    to spill_file as they arrive so only the chunks stay in memory.
+    Returns all chunks and the (chunk count, byte size) of every batch.
+    """
+    chunks, sizes = [], []
+    for batch, embeddings in batches:
+        data = np.ascontiguousarray(embeddings, dtype=np.float32).tobytes()
+        spill_file.write(data)
+        chunks.extend(batch)
+        sizes.append((len(batch), len(data)))
+    return chunks, sizes
+
+
+def _read_spilled(spill_file, chunks, sizes):
+    """
+    Yield the batches _spill wrote back as (chunks, embeddings), in order.
+    """
+    spill_file.seek(0)
+    start = 0
+    for count, size in sizes:
+        embeddings = np.frombuffer(spill_file.read(size), dtype=np.float32).reshape(count, -1)
+        yield chunks[start:start + count], embeddings
+        start += count
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus():
+    """
+    Return the process-wide Corpus, so every chat session works on one
+    catalog and index instead of private copies.
+    """
+    global _corpus
+    if _corpus is None:
+        with _corpus_lock:
+            if _corpus is None:
+                _corpus = Corpus()
+    return _corpus
@@ -0,0 +1,153 @@
+import os
+import hashlib
+import numpy as np
+from src.chunker import Chunk
+from src.config import (
+    EMBEDDING_MODEL, CHUNK_MODE, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_TOKEN_OVERLAP
+)
+from src.utils import setup_logging, save_metadata, load_metadata
+
+logger = setup_logging()
+
+DOC_STORE_VERSION = 2
+
+CHUNK_COLUMNS = np.dtype([
+    ("chunk_id", np.int64),
+    ("text_start", np.int64),
+    ("text_end", np.int64),
+    ("page_start", np.int32),
+    ("page_end", np.int32),
+    ("char_start", np.int64),
+    ("char_end", np.int64),
+    ("token_count", np.int32),
+])
+
+
+def file_fingerprint(pdf_path):
+    """
+    Content hash of a PDF. Reads raw bytes only; nothing is parsed.
+    """
+    digest = hashlib.sha1()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pipeline_fingerprint():
+    """
+    Settings that change what gets chunked and embedded. A store written
+    under different settings cannot be reused.
+    """
+    return {
+        "embedding_model": EMBEDDING_MODEL,
+        "chunk_mode": CHUNK_MODE,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_token_overlap": CHUNK_TOKEN_OVERLAP,
+    }
+
+
+class ChunkTable:
+    """
+    Read-only, memory-mapped sequence of Chunk records in document order.
+    Chunk objects are only materialised when accessed. Chunk ids are
+    stable across incremental re-indexing, so they need not match positions;
+    use get() to look a chunk up by id.
+    """
+
+    def __init__(self, columns, text):
+        self.columns = columns
+        self.text = text
+        self._positions = None
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, i):
+        row = self.columns[i]
+        text = bytes(self.text[row["text_start"]:row["text_end"]]).decode("utf-8")
+        return Chunk(int(row["chunk_id"]), text, int(row["page_start"]), int(row["page_end"]),
+                     int(row["char_start"]), int(row["char_end"]), int(row["token_count"]))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def get(self, chunk_id):
+        """
+        Look a chunk up by its id.
+        """
+        if self._positions is None:
+            self._positions = {int(chunk_id): i for i, chunk_id in enumerate(self.columns["chunk_id"])}
+        return self[self._positions[chunk_id]]
+
+    def page_index(self):
+        """
+        Page -> chunk ids map, built from the page columns without decoding text.
+        """
+        page_index = {}
+        columns = zip(self.columns["chunk_id"], self.columns["page_start"], self.columns["page_end"])
+        for chunk_id, first, last in columns:
+            for page_num in range(int(first), int(last) + 1):
+                page_index.setdefault(page_num, []).append(int(chunk_id))
+        return page_index
+
+
+def save_doc_store(store_dir, chunks, pdf_info, images, pdf_hash, page_fingerprints=None, page_lengths=None):
+    """
+    Write chunk texts, chunk metadata, pdf_info and the image manifest.
+    Page fingerprints and text lengths let a revised PDF be re-indexed
+    incrementally.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    columns = np.zeros(len(chunks), dtype=CHUNK_COLUMNS)
+    position = 0
+    with open(os.path.join(store_dir, "text.bin"), "wb") as f:
+        for i, chunk in enumerate(chunks):
+            data = chunk.text.encode("utf-8")
+            f.write(data)
+            columns[i] = (chunk.chunk_id, position, position + len(data), chunk.page_start, chunk.page_end,
+                          chunk.char_start, chunk.char_end, chunk.token_count)
+            position += len(data)
+    np.save(os.path.join(store_dir, "chunks.npy"), columns)
+
+    # The manifest goes last so a half-written store is never mistaken for a valid one
+    save_metadata({
+        "version": DOC_STORE_VERSION,
+        "pdf_hash": pdf_hash,
+        "pipeline": pipeline_fingerprint(),
+        "chunk_count": len(chunks),
+        "pdf_info": pdf_info,
+        "images": images,
+        "page_fingerprints": page_fingerprints or [],
+        "page_lengths": page_lengths or [],
+    }, os.path.join(store_dir, "manifest.json"))
+    logger.info(f"Document store saved to {store_dir} ({len(chunks)} chunks)")
+
+
+def load_doc_store(store_dir, pdf_hash=None):
+    """
+    Open a document store. Returns (chunks, manifest), or None if the store
+    is missing, from an older version, built with different settings, or
+    (when pdf_hash is given) built from a different PDF.
+    """
+    manifest = load_metadata(os.path.join(store_dir, "manifest.json"))
+    if not manifest:
+        return None
+    if manifest.get("version") != DOC_STORE_VERSION or manifest.get("pipeline") != pipeline_fingerprint():
+        logger.info(f"Document store at {store_dir} is stale; it will be rebuilt.")
+        return None
+    if pdf_hash is not None and manifest.get("pdf_hash") != pdf_hash:
+        return None
+
+    # Empty arrays cannot be memory-mapped
+    mmap_mode = "r" if manifest.get("chunk_count") else None
+    columns = np.load(os.path.join(store_dir, "chunks.npy"), mmap_mode=mmap_mode)
+    text_path = os.path.join(store_dir, "text.bin")
+    if os.path.getsize(text_path):
+        text = np.memmap(text_path, dtype=np.uint8, mode="r")
+    else:
+        text = np.zeros(0, dtype=np.uint8)
+    return ChunkTable(columns, text), manifest
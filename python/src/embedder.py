@@ -1,7 +1,272 @@
-from sentence_transformers import SentenceTransformer
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from src.embedding_cache import EmbeddingCache, normalize_chunk
+from src.config import (
+    EMBEDDING_MODEL, EMBED_CACHE_ENABLED, EMBED_CACHE_DIR, EMBED_CACHE_DTYPE, EMBED_CACHE_MAX_ENTRIES,
+    EMBED_ENCODE_BATCH_SIZE, EMBED_PROCESSES, QUERY_CACHE_MAX_ENTRIES
+)
+from src.utils import setup_logging
 
-model = SentenceTransformer("all-MiniLM-L6-v2")  # 384-dim embeddings
+logger = setup_logging()
 
-def embed_text(text_chunks):
-    embeddings = model.encode(text_chunks)
+_model = None
+_model_lock = threading.Lock()
+_cache = None
+_timings = {}
+_pool = None
+_pool_lock = threading.Lock()
+_last_stats = {}
+_query_cache = OrderedDict()  # normalized query -> embedding, least recently used first
+_query_cache_lock = threading.Lock()
+_query_stats = {"hits": 0, "misses": 0}
+
+PRECISIONS = ("float32", "float16", "int8")
+
+def get_model():
+    """
+    Return the process-wide SentenceTransformer, loading it on first use.
+    Importing this module stays cheap; sentence_transformers (and torch)
+    are only imported when an embedding is actually needed.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                imported = time.perf_counter()
+                _model = SentenceTransformer(EMBEDDING_MODEL)  # 384-dim embeddings
+                loaded = time.perf_counter()
+                _timings["import_seconds"] = round(imported - started, 3)
+                _timings["load_seconds"] = round(loaded - imported, 3)
+                logger.info(f"Loaded embedding model {EMBEDDING_MODEL} in {loaded - started:.2f}s "
+                            f"(import {imported - started:.2f}s, weights {loaded - imported:.2f}s)")
+    return _model
+
+def warm_up(background=False):
+    """
+    Load the model and run one tiny encode so the first real query does not
+    pay for lazy initialisation. With background=True this returns at once
+    and warms up on a daemon thread.
+    """
+    if background:
+        thread = threading.Thread(target=warm_up, daemon=True)
+        thread.start()
+        return thread
+    model = get_model()
+    started = time.perf_counter()
+    model.encode(["warm up"])
+    _timings["warmup_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Embedding model warm-up took {_timings['warmup_seconds']}s")
+
+def get_model_timings():
+    """
+    Timing breakdown of model import, load and warm-up (seconds).
+    """
+    return dict(_timings)
+
+def is_model_loaded():
+    return _model is not None
+
+def get_embedding_cache():
+    """
+    Return the shared on-disk embedding cache, or None if it is disabled.
+    """
+    global _cache
+    if EMBED_CACHE_ENABLED and _cache is None:
+        _cache = EmbeddingCache(
+            EMBED_CACHE_DIR,
+            EMBEDDING_MODEL,
+            get_model().get_sentence_embedding_dimension(),
+            dtype=EMBED_CACHE_DTYPE,
+            max_entries=EMBED_CACHE_MAX_ENTRIES,
+        )
+    return _cache
+
+def embed_text(text_chunks, use_cache=True):
+    """
+    Embed a list of texts. Chunks seen before (by this model) are served
+    from the embedding cache and only the rest go through the model.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return encode_batch(text_chunks)
+
+    embeddings, keys, missing = cache.lookup(text_chunks)
+    if missing:
+        fresh = encode_batch([text_chunks[i] for i in missing])
+        embeddings[missing] = fresh
+        cache.store([keys[i] for i in missing], fresh)
     return embeddings
+
+def _get_pool(processes):
+    """
+    Start (once) a pool of CPU encode worker processes.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = get_model().start_multi_process_pool(target_devices=["cpu"] * processes)
+            atexit.register(stop_pool)
+            logger.info(f"Started embedding pool with {processes} processes")
+    return _pool
+
+def stop_pool():
+    """
+    Shut down the encode worker processes, if running.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            from sentence_transformers import SentenceTransformer
+            SentenceTransformer.stop_multi_process_pool(_pool)
+            _pool = None
+
+def quantize(embeddings, precision):
+    """
+    Convert float32 embeddings to the requested precision.
+    int8 maps the unit-normalised components [-1, 1] onto [-127, 127].
+    """
+    if precision == "float32":
+        return embeddings
+    if precision == "float16":
+        return embeddings.astype(np.float16)
+    if precision == "int8":
+        return np.clip(np.rint(embeddings * 127.0), -127, 127).astype(np.int8)
+    raise ValueError(f"Unknown precision '{precision}'. Choose one of {PRECISIONS}")
+
+def dequantize(embeddings):
+    """
+    Convert quantized embeddings back to float32 (e.g. before indexing).
+    """
+    if embeddings.dtype == np.int8:
+        return embeddings.astype(np.float32) / 127.0
+    return embeddings.astype(np.float32)
+
+def encode_batch(texts, batch_size=EMBED_ENCODE_BATCH_SIZE, precision="float32", processes=EMBED_PROCESSES):
+    """
+    Encode texts with length-sorted batching and, for large inputs, a pool
+    of CPU worker processes. Sorting by token count means each batch pads
+    to similar lengths. Throughput is logged and kept for get_embedding_stats().
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}'. Choose one of {PRECISIONS}")
+    model = get_model()
+    if len(texts) == 0:
+        return quantize(np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32), precision)
+    processes = processes or os.cpu_count() or 1
+    use_pool = processes > 1 and len(texts) >= batch_size * processes
+    started = time.perf_counter()
+
+    token_counts = [
+        min(len(ids), model.max_seq_length)
+        for ids in model.tokenizer(list(texts), add_special_tokens=True)["input_ids"]
+    ]
+    order = sorted(range(len(texts)), key=lambda i: -token_counts[i])
+    sorted_texts = [texts[i] for i in order]
+
+    normalize = precision == "int8"
+    if use_pool:
+        pool = _get_pool(processes)
+        sorted_embeddings = model.encode_multi_process(
+            sorted_texts, pool, batch_size=batch_size, normalize_embeddings=normalize
+        )
+    else:
+        sorted_embeddings = model.encode(sorted_texts, batch_size=batch_size, normalize_embeddings=normalize)
+
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+    embeddings = quantize(embeddings, precision)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    _last_stats.clear()
+    _last_stats.update({
+        "chunks": len(texts),
+        "tokens": sum(token_counts),
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(texts) / elapsed, 1),
+        "tokens_per_sec": round(sum(token_counts) / elapsed, 1),
+        "batch_size": batch_size,
+        "processes": processes if use_pool else 1,
+        "precision": precision,
+    })
+    logger.info(f"Embedded {len(texts)} chunks in {elapsed:.2f}s "
+                f"({_last_stats['chunks_per_sec']} chunks/s, {_last_stats['tokens_per_sec']} tokens/s)")
+    return embeddings
+
+def get_embedding_stats():
+    """
+    Throughput of the most recent encode_batch call.
+    """
+    return dict(_last_stats)
+
+def embed_query(query):
+    """
+    Embed a single search query.
+    """
+    return embed_queries([query])[0]
+
+def embed_queries(queries):
+    """
+    Embed several search queries (e.g. from query expansion) in one
+    forward pass. Queries are whitespace-normalized, and recently seen
+    ones come from an in-process LRU cache instead of the model.
+    """
+    keys = [normalize_chunk(query) for query in queries]
+    found = {}
+    with _query_cache_lock:
+        for key in keys:
+            if key in _query_cache:
+                _query_cache.move_to_end(key)
+                found[key] = _query_cache[key]
+        hits = sum(key in found for key in keys)
+        _query_stats["hits"] += hits
+        _query_stats["misses"] += len(keys) - hits
+
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    if missing:
+        vectors = get_model().encode(missing, batch_size=EMBED_ENCODE_BATCH_SIZE)
+        with _query_cache_lock:
+            for key, vector in zip(missing, vectors):
+                vector.setflags(write=False)  # shared between callers
+                _query_cache[key] = found[key] = vector
+            while len(_query_cache) > QUERY_CACHE_MAX_ENTRIES:
+                _query_cache.popitem(last=False)
+
+    return np.stack([found[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+def get_query_cache_stats():
+    """
+    Hit and miss counts of the query embedding cache.
+    """
+    with _query_cache_lock:
+        lookups = _query_stats["hits"] + _query_stats["misses"]
+        return dict(
+            _query_stats,
+            entries=len(_query_cache),
+            hit_rate=round(_query_stats["hits"] / lookups, 3) if lookups else 0.0,
+        )
+
+def flush_embedding_cache():
+    """
+    Write pending embedding cache updates to disk.
+    """
+    if _cache is not None:
+        _cache.flush()
+
+def get_tokenizer():
+    """
+    Return the tokenizer the embedding model uses.
+    """
+    return get_model().tokenizer
+
+def get_max_tokens():
+    """
+    Number of content tokens the model sees per input; anything beyond
+    this is truncated. Leaves room for the [CLS] and [SEP] tokens.
+    """
+    return get_model().max_seq_length - 2
@@ -0,0 +1,161 @@
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from src.utils import setup_logging, save_metadata, load_metadata
+
+logger = setup_logging()
+
+
+def normalize_chunk(text):
+    """
+    Normalize chunk text so trivially different copies share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def chunk_key(model_name, text):
+    """
+    Content address of a chunk for a given embedding model.
+    """
+    payload = f"{model_name}\0{normalize_chunk(text)}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache keyed by (model name, normalized chunk text).
+
+    Vectors live in one memory-mapped matrix (vectors.bin); index.json maps
+    each chunk hash to its row and a last-used tick for LRU eviction.
+    """
+
+    def __init__(self, cache_dir, model_name, dim, dtype="float16", max_entries=200000):
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.max_entries = max_entries
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_file = os.path.join(self.cache_dir, "vectors.bin")
+        self.index_file = os.path.join(self.cache_dir, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        meta = load_metadata(self.index_file)
+        if meta and (meta.get("dim") != self.dim or meta.get("dtype") != self.dtype.name):
+            logger.warning(f"Embedding cache at {self.cache_dir} has a different layout; starting fresh.")
+            meta = {}
+        self.entries = meta.get("entries", {})
+        self.tick = meta.get("tick", 0)
+        self.rows = meta.get("rows", 0)
+        used = {slot for slot, _ in self.entries.values()}
+        self.free_slots = [slot for slot in range(self.rows) if slot not in used]
+        self.vectors = None
+        if self.rows:
+            self.vectors = np.memmap(self.vectors_file, dtype=self.dtype, mode="r+", shape=(self.rows, self.dim))
+
+    def _grow(self, needed):
+        """
+        Extend the vector file so at least `needed` more rows are free.
+        """
+        new_rows = max(self.rows * 2, self.rows + needed, 1024)
+        new_rows = min(new_rows, max(self.max_entries, self.rows + needed))
+        if self.vectors is not None:
+            self.vectors.flush()
+        with open(self.vectors_file, "ab") as f:
+            f.truncate(new_rows * self.dim * self.dtype.itemsize)
+        self.free_slots.extend(range(self.rows, new_rows))
+        self.rows = new_rows
+        self.vectors = np.memmap(self.vectors_file, dtype=self.dtype, mode="r+", shape=(self.rows, self.dim))
+
+    def _evict(self, count):
+        """
+        Free the `count` least recently used slots.
+        """
+        oldest = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (slot, _) in oldest:
+            del self.entries[key]
+            self.free_slots.append(slot)
+        logger.info(f"Evicted {len(oldest)} entries from the embedding cache.")
+
+    def lookup(self, texts):
+        """
+        Return (embeddings, keys, missing) for a list of texts.
+        Rows for cache hits are filled in; `missing` lists the positions
+        that still need to be embedded.
+        """
+        keys = [chunk_key(self.model_name, text) for text in texts]
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    missing.append(i)
+                    continue
+                self.tick += 1
+                entry[1] = self.tick
+                embeddings[i] = self.vectors[entry[0]]
+            self._dirty = self._dirty or len(missing) < len(texts)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return embeddings, keys, missing
+
+    def store(self, keys, embeddings):
+        """
+        Store freshly computed embeddings under their chunk keys.
+        """
+        with self._lock:
+            # A chunk repeated within the batch gets a single row
+            fresh = {key: vector for key, vector in zip(keys, embeddings) if key not in self.entries}
+            new_keys = list(fresh.items())
+            overflow = len(self.entries) + len(new_keys) - self.max_entries
+            if overflow > 0:
+                # Evict a little extra so eviction does not run on every batch
+                self._evict(min(len(self.entries), overflow + self.max_entries // 10))
+            new_keys = new_keys[-self.max_entries:]
+            if len(self.free_slots) < len(new_keys):
+                self._grow(len(new_keys) - len(self.free_slots))
+            for key, vector in new_keys:
+                slot = self.free_slots.pop()
+                self.vectors[slot] = vector
+                self.tick += 1
+                self.entries[key] = [slot, self.tick]
+            if len(self.entries) > self.max_entries:
+                self._evict(len(self.entries) - self.max_entries)
+            self._dirty = self._dirty or bool(new_keys)
+
+    def flush(self):
+        """
+        Persist vectors and the hash index to disk.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            if self.vectors is not None:
+                self.vectors.flush()
+            save_metadata({
+                "model": self.model_name,
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "rows": self.rows,
+                "tick": self.tick,
+                "entries": self.entries,
+            }, self.index_file, compact=True)
+            self._dirty = False
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
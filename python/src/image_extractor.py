@@ -0,0 +1,149 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import fitz
+from src.config import EXTRACT_WORKERS, IMAGE_MIN_SIZE, IMAGE_WRITE_WORKERS
+from src.pdf_extractor import iter_sharded, _page_shards
+from src.vision_cache import image_hash
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+def _extract_page_images(args):
+    """
+    Pull the images of some pages out of the PDF. Runs inside a worker
+    process for large documents. Sizes come from the image dictionaries,
+    so tiny images are skipped without being decoded, and an xref seen
+    earlier in the shard is sent without its bytes.
+    Returns (images, skipped_count).
+    """
+    pdf_path, page_numbers, min_size = args
+    with fitz.open(pdf_path) as doc:
+        return _page_images(doc, page_numbers, min_size)
+
+
+def _page_images(doc, page_numbers, min_size):
+    found = []
+    skipped = 0
+    sent = set()
+    for page_num in page_numbers:
+        page_xrefs = set()
+        for img_index, img in enumerate(doc[page_num - 1].get_images(full=True)):
+            xref, width, height = img[0], img[2], img[3]
+            if xref in page_xrefs:
+                continue  # the same image drawn twice on one page
+            page_xrefs.add(xref)
+            if min(width, height) < min_size:
+                skipped += 1  # decorative rules, bullets, spacers
+                continue
+
+            item = {"page": page_num, "img_index": img_index + 1, "xref": xref,
+                    "width": width, "height": height, "ext": None, "image": None}
+            if xref not in sent:
+                base_image = doc.extract_image(xref)
+                if not base_image:
+                    continue
+                item.update(ext=base_image["ext"], image=base_image["image"],
+                            width=base_image["width"], height=base_image["height"])
+                sent.add(xref)
+            found.append(item)
+    return found, skipped
+
+
+def _write_image(path, image_bytes):
+    with open(path, "wb") as img_file:
+        img_file.write(image_bytes)
+
+
+def iter_extracted_images(pdf_path, output_dir, pages=None, known_hashes=None, min_size=IMAGE_MIN_SIZE,
+                          workers=EXTRACT_WORKERS, write_workers=IMAGE_WRITE_WORKERS, document=None):
+    """
+    Extract the images of a PDF (or of the 1-based `pages`) into output_dir
+    and yield one metadata record per image, in page order, as soon as its
+    file is written.
+
+    Pages are sharded across a process pool for large documents, files are
+    written by a bounded thread pool, and images smaller than `min_size`
+    pixels on either side are skipped. An image repeated on several pages
+    (same xref, or same bytes as an image in `known_hashes` or earlier in
+    the document) is written once; later records point at that file and
+    carry its `source_page`. An open PDFDocument is reused for in-process
+    extraction.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if document is not None:
+        page_count = document.page_count
+    else:
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+    if pages is None:
+        page_numbers = list(range(1, page_count + 1))
+    else:
+        page_numbers = sorted(page for page in pages if page <= page_count)
+
+    workers = workers or os.cpu_count() or 1
+    shard_args = [
+        (pdf_path, page_numbers[start:end], min_size)
+        for start, end in _page_shards(len(page_numbers), workers)
+    ]
+    if document is not None and (workers == 1 or len(shard_args) <= 1):
+        shard_results = (
+            _page_images(document.fitz_doc, shard_pages, size) for _, shard_pages, size in shard_args
+        )
+    elif workers == 1 or len(shard_args) <= 1:
+        shard_results = map(_extract_page_images, shard_args)
+    else:
+        shard_results = iter_sharded(_extract_page_images, shard_args, workers)
+
+    seen_xrefs = {}
+    seen_hashes = dict(known_hashes or {})
+    counts = {"images": 0, "duplicates": 0, "skipped": 0}
+    writes = deque()  # (write future or None, record), in page order
+
+    with ThreadPoolExecutor(max_workers=write_workers) as io_pool:
+        for found, skipped in shard_results:
+            counts["skipped"] += skipped
+            for item in found:
+                counts["images"] += 1
+                original = seen_xrefs.get(item["xref"])
+                if original is None:
+                    if item["image"] is None:
+                        continue
+                    content_hash = image_hash(item["image"])
+                    original = seen_hashes.get(content_hash)
+
+                if original is not None:
+                    record = dict(original, page=item["page"], source_page=original.get("source_page", original["page"]))
+                    seen_xrefs[item["xref"]] = original
+                    counts["duplicates"] += 1
+                    writes.append((None, record))
+                else:
+                    image_filename = f"page_{item['page']}_img_{item['img_index']}.{item['ext']}"
+                    record = {
+                        "path": os.path.join(output_dir, image_filename),
+                        "page": item["page"],
+                        "filename": image_filename,
+                        "format": item["ext"],
+                        "width": item["width"],
+                        "height": item["height"],
+                        "sha1": content_hash,
+                    }
+                    seen_xrefs[item["xref"]] = seen_hashes[content_hash] = record
+                    writes.append((io_pool.submit(_write_image, record["path"], item["image"]), record))
+
+                # Hand records on as their writes finish, keeping a bounded backlog
+                while writes and (len(writes) > write_workers * 4 or writes[0][0] is None or writes[0][0].done()):
+                    future, record = writes.popleft()
+                    if future is not None:
+                        future.result()
+                    yield record
+
+        while writes:
+            future, record = writes.popleft()
+            if future is not None:
+                future.result()
+            yield record
+
+    logger.info(f"Extracted {counts['images']} images from PDF ({counts['duplicates']} duplicates stored once, "
+                f"{counts['skipped']} below {min_size}px skipped)")
@@ -1,9 +1,18 @@
 import os
+import asyncio
 import base64
 import requests
 from PIL import Image
-import fitz
-from src.config import VISION_MODEL, VISION_MODEL_FALLBACK, AUTO_FALLBACK
+from src.config import (
+    VISION_MODEL, VISION_MODEL_FALLBACK, AUTO_FALLBACK,
+    IMAGE_INDEX_ENABLED, IMAGE_SEARCH_TOP_K, IMAGE_SEARCH_MIN_SCORE
+)
+from src.image_extractor import iter_extracted_images
+from src.pdf_extractor import get_page_count
+from src.image_index import build_image_index, load_image_index, search_image_index
+from src.ollama_client import get_client
+from src.vision_cache import get_vision_cache, image_hash
+from src.vision_scheduler import get_vision_scheduler, iter_completed, INTERACTIVE, BACKGROUND
 from src.utils import setup_logging, save_metadata, load_metadata
 
 logger = setup_logging()
@@ -12,64 +21,75 @@ class ImageHandler:
     def __init__(self, metadata_file="data/extracted_images/metadata.json"):
         self.metadata_file = metadata_file
         self.images = self.load_images()
+        self.image_index = None
+        self.vision_cache = get_vision_cache()
 
-    def extract_images_from_pdf(self, pdf_path, output_dir="data/extracted_images"):
+    def extract_images_from_pdf(self, pdf_path, output_dir="data/extracted_images", pages=None, document=None):
         """
         Extract all images from PDF and save them to output directory.
         Returns list of image paths with metadata.
+        If pages (1-based) is given, only those pages are re-extracted and the
+        current records for every other page are kept.
+        `document` is an open PDFDocument to reuse instead of reopening the file.
         """
-        os.makedirs(output_dir, exist_ok=True)
-        image_paths = []
-        
         try:
-            pdf_document = fitz.open(pdf_path)
-            image_count = 0
+            known_hashes = {}
+            if pages is not None:
+                pages = set(pages)
+                # Pages sharing a file owned by a re-extracted page are redone too
+                pages |= {img['page'] for img in self.images if img.get('source_page', img['page']) in pages}
+                for img in self.images:
+                    if img['page'] not in pages and img.get('sha1'):
+                        known_hashes.setdefault(img['sha1'], img)
             
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                image_list = page.get_images(full=True)
-                
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    base_image = pdf_document.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    # Save image
-                    image_filename = f"page_{page_num + 1}_img_{img_index + 1}.{image_ext}"
-                    image_path = os.path.join(output_dir, image_filename)
-                    
-                    with open(image_path, "wb") as img_file:
-                        img_file.write(image_bytes)
-                    
-                    # Get image dimensions
-                    try:
-                        with Image.open(image_path) as pil_img:
-                            width, height = pil_img.size
-                    except:
-                        width, height = "?", "?"
-                    
-                    image_paths.append({
-                        "path": image_path,
-                        "page": page_num + 1,
-                        "filename": image_filename,
-                        "format": image_ext,
-                        "width": width,
-                        "height": height,
-                        "index": image_count + 1
-                    })
-                    image_count += 1
+            image_paths = []
+            for img in iter_extracted_images(pdf_path, output_dir, pages, known_hashes, document=document):
+                img['index'] = len(image_paths) + 1
+                image_paths.append(img)
+            
+            if pages is not None:
+                page_total = document.page_count if document is not None else get_page_count(pdf_path, "pymupdf")
+                kept = [img for img in self.images if img['page'] not in pages and img['page'] <= page_total]
+                image_paths = sorted(kept + image_paths, key=lambda img: img['page'])
+                for number, img in enumerate(image_paths, 1):
+                    img['index'] = number
             
-            pdf_document.close()
-            logger.info(f"Extracted {image_count} images from PDF")
             self.images = image_paths
             self.save_images()
+            self.index_images(output_dir, pages)
             return image_paths
             
         except Exception as e:
             logger.error(f"Error extracting images: {e}")
             return []
 
+    def index_images(self, output_dir, refresh_pages=None):
+        """
+        Embed the extracted images for search_images_by_topic. After a
+        partial extraction only images on `refresh_pages` are re-embedded.
+        """
+        self.image_index = None
+        if not IMAGE_INDEX_ENABLED or not self.images:
+            return
+        try:
+            self.image_index = build_image_index(self.images, output_dir, refresh_pages)
+        except Exception as e:
+            logger.warning(f"Could not build the image index; topic search will use the vision model: {e}")
+
+    def get_image_index(self):
+        """
+        Vector index matching the current images, loading it from the image
+        folder when the images were restored from the corpus. None if missing.
+        """
+        if not IMAGE_INDEX_ENABLED or not self.images:
+            return None
+        filenames = [img['filename'] for img in self.images]
+        if self.image_index is None or self.image_index[0] != filenames:
+            self.image_index = load_image_index(os.path.dirname(self.images[0]['path']))
+        if self.image_index is None or self.image_index[0] != filenames:
+            return None
+        return self.image_index
+
     def analyze_image_with_ollama(self, image_path, question=None):
         """
         Analyze an image using Ollama's vision model.
@@ -79,25 +99,24 @@ class ImageHandler:
         
         try:
             # Read and encode image
-            with open(image_path, "rb") as img_file:
-                image_data = base64.b64encode(img_file.read()).decode('utf-8')
+            content_hash, image_data = self.read_image(image_path)
+            cached = self.cached_analysis(content_hash, question)
+            if cached is not None:
+                return cached
             
             # Try primary vision model
             try:
-                response = requests.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": VISION_MODEL,
-                        "prompt": question,
-                        "images": [image_data],
-                        "stream": False
-                    },
-                    timeout=60
-                )
+                response = get_client().generate({
+                    "model": VISION_MODEL,
+                    "prompt": question,
+                    "images": [image_data],
+                    "stream": False
+                })
                 
                 if response.status_code == 200:
                     result = response.json()
-                    return result.get("response", "No response from vision model")
+                    return self.remember_analysis(content_hash, VISION_MODEL, question, result,
+                                                  "No response from vision model")
                 else:
                     raise Exception(f"Vision model returned status {response.status_code}")
                     
@@ -105,20 +124,17 @@ class ImageHandler:
                 # Try fallback model if auto-fallback is enabled
                 if AUTO_FALLBACK:
                     logger.warning(f"Primary model failed, trying {VISION_MODEL_FALLBACK}...")
-                    response = requests.post(
-                        "http://localhost:11434/api/generate",
-                        json={
-                            "model": VISION_MODEL_FALLBACK,
-                            "prompt": question,
-                            "images": [image_data],
-                            "stream": False
-                        },
-                        timeout=60
-                    )
+                    response = get_client().generate({
+                        "model": VISION_MODEL_FALLBACK,
+                        "prompt": question,
+                        "images": [image_data],
+                        "stream": False
+                    })
                     
                     if response.status_code == 200:
                         result = response.json()
-                        return result.get("response", "No response from fallback vision model")
+                        return self.remember_analysis(content_hash, VISION_MODEL_FALLBACK, question, result,
+                                                      "No response from fallback vision model")
                     else:
                         raise Exception(f"Fallback model also failed: {response.status_code}")
                 else:
@@ -129,6 +145,89 @@ class ImageHandler:
         except Exception as e:
             return f"Error analyzing image: {str(e)}\nMake sure vision model '{VISION_MODEL}' is installed: ollama pull {VISION_MODEL}"
 
+    def analyze_images(self, images, question=None, priority=INTERACTIVE):
+        """
+        Analyze several images concurrently through the shared vision
+        scheduler. Yields (img_info, analysis) in completion order; closing
+        the generator cancels the analyses that have not started.
+        """
+        by_path = {}
+        for img_info in images:
+            by_path.setdefault(img_info['path'], []).append(img_info)
+        scheduler = get_vision_scheduler()
+        jobs = {
+            scheduler.submit(self.analyze_image_with_ollama, path, question, priority=priority): path
+            for path in by_path
+        }
+        for path, analysis in iter_completed(jobs):
+            for img_info in by_path[path]:
+                yield img_info, analysis
+
+    def precaption_images(self):
+        """
+        Queue a background description of every image, so later requests
+        are answered from the vision cache. Returns the jobs' futures.
+        """
+        scheduler = get_vision_scheduler()
+        paths = dict.fromkeys(img['path'] for img in self.images)
+        logger.info(f"Queued {len(paths)} image(s) for background captioning.")
+        return [scheduler.submit(self.analyze_image_with_ollama, path, priority=BACKGROUND) for path in paths]
+
+    def cancel_background_analysis(self):
+        """
+        Drop queued pre-captioning jobs.
+        """
+        return get_vision_scheduler().cancel(BACKGROUND)
+
+    async def analyze_image_async(self, image_path, question=None):
+        """
+        asyncio version of analyze_image_with_ollama. The call runs on the
+        shared vision scheduler, so async sessions count against the same
+        in-flight limit and priorities as everything else.
+        """
+        future = get_vision_scheduler().submit(self.analyze_image_with_ollama, image_path, question)
+        return await asyncio.wrap_future(future)
+
+    async def analyze_images_async(self, images, question=None):
+        """
+        asyncio version of analyze_images. Returns the analyses in the order
+        of `images`; each distinct path is analyzed once.
+        """
+        paths = list(dict.fromkeys(img_info['path'] for img_info in images))
+        analyses = await asyncio.gather(*[self.analyze_image_async(path, question) for path in paths])
+        by_path = dict(zip(paths, analyses))
+        return [by_path[img_info['path']] for img_info in images]
+
+    @staticmethod
+    def read_image(image_path):
+        """
+        Content hash and base64 payload of an image for the vision model.
+        """
+        with open(image_path, "rb") as img_file:
+            image_bytes = img_file.read()
+        return image_hash(image_bytes), base64.b64encode(image_bytes).decode('utf-8')
+
+    def cached_analysis(self, content_hash, question):
+        """
+        A stored answer to `question` about this image from the primary
+        vision model (or the fallback, if enabled), or None.
+        """
+        if self.vision_cache is None:
+            return None
+        models = [VISION_MODEL, VISION_MODEL_FALLBACK] if AUTO_FALLBACK else [VISION_MODEL]
+        return self.vision_cache.lookup(content_hash, models, question)
+
+    def remember_analysis(self, content_hash, model_name, question, result, default):
+        """
+        Return the vision model's answer, caching it when there is one.
+        """
+        answer = result.get("response")
+        if not answer:
+            return default
+        if self.vision_cache is not None:
+            self.vision_cache.store(content_hash, model_name, question, answer)
+        return answer
+
     def save_images(self):
         """
         Save image metadata to JSON.
@@ -182,7 +281,7 @@ class ImageHandler:
             
             if analyze:
                 logger.info("Analyzing image content...")
-                description = self.analyze_image_with_ollama(img_info['path'])
+                _, description = next(self.analyze_images([img_info]))
                 logger.info(f"Image Analysis:\n{description}")
                 return description
             
@@ -200,24 +299,54 @@ class ImageHandler:
 
     def search_images_by_topic(self, topic):
         """
-        Search for images related to a topic by analyzing their content.
+        Search for images related to a topic. Uses the image vector index
+        when available, otherwise asks the vision model about every image.
         """
         if not self.images:
             return []
         
         logger.info(f"Searching for images related to: {topic}")
-        relevant_images = []
+        image_index = self.get_image_index()
+        if image_index is not None:
+            return [
+                {"info": self.images[position], "analysis": f"Similarity to '{topic}': {score:.2f}"}
+                for position, score in search_image_index(image_index, topic, IMAGE_SEARCH_TOP_K, IMAGE_SEARCH_MIN_SCORE)
+            ]
         
-        for img_info in self.images:
-            # Analyze each image with the topic as context
-            question = f"Does this image relate to {topic}? Answer yes or no, then briefly explain why."
-            analysis = self.analyze_image_with_ollama(img_info['path'], question)
-            
+        relevant_images = []
+        # Analyze the images concurrently with the topic as context
+        for img_info, analysis in self.analyze_images(self.images, self.topic_question(topic)):
             # Check if the response indicates relevance
-            if "yes" in analysis.lower()[:50]:  # Check beginning of response
+            if self.is_relevant(analysis):
                 relevant_images.append({
                     "info": img_info,
                     "analysis": analysis
                 })
         
-        return relevant_images
\ No newline at end of file
+        return sorted(relevant_images, key=lambda result: result['info']['index'])
+
+    async def search_images_by_topic_async(self, topic):
+        """
+        asyncio version of search_images_by_topic; without an image index,
+        images are analyzed concurrently on the vision scheduler.
+        """
+        if not self.images:
+            return []
+        if self.get_image_index() is not None:
+            return await asyncio.to_thread(self.search_images_by_topic, topic)
+        
+        logger.info(f"Searching for images related to: {topic}")
+        analyses = await self.analyze_images_async(self.images, self.topic_question(topic))
+        return [
+            {"info": img_info, "analysis": analysis}
+            for img_info, analysis in zip(self.images, analyses)
+            if self.is_relevant(analysis)
+        ]
+
+    @staticmethod
+    def topic_question(topic):
+        return f"Does this image relate to {topic}? Answer yes or no, then briefly explain why."
+
+    @staticmethod
+    def is_relevant(analysis):
+        return "yes" in analysis.lower()[:50]  # Check beginning of response
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+import numpy as np
+from PIL import Image
+from src.config import IMAGE_EMBEDDING_MODEL, IMAGE_EMBED_BATCH_SIZE
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+IMAGE_INDEX_FILE = "image_index.npz"
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_image_model():
+    """
+    Return the process-wide CLIP model, which embeds images and text
+    into the same space. Loaded on first use, like the text embedder.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(IMAGE_EMBEDDING_MODEL)
+                logger.info(f"Loaded image embedding model {IMAGE_EMBEDDING_MODEL} "
+                            f"in {time.perf_counter() - started:.2f}s")
+    return _model
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed_images(paths, batch_size=IMAGE_EMBED_BATCH_SIZE):
+    """
+    Unit-length CLIP embeddings for image files. Images that cannot be
+    read get a zero vector, so they never match a topic.
+    """
+    rows, vectors = [], []
+    for start in range(0, len(paths), batch_size):
+        batch = []
+        for row, path in enumerate(paths[start:start + batch_size], start):
+            try:
+                with Image.open(path) as img:
+                    batch.append(img.convert("RGB"))
+                rows.append(row)
+            except Exception as e:
+                logger.warning(f"Skipping unreadable image {path}: {e}")
+        if batch:
+            vectors.append(_normalize(get_image_model().encode(batch, batch_size=batch_size)))
+
+    dim = vectors[0].shape[1] if vectors else 0
+    matrix = np.zeros((len(paths), dim), dtype=np.float32)
+    if rows:
+        matrix[rows] = np.concatenate(vectors)
+    return matrix
+
+
+def build_image_index(images, output_dir, refresh_pages=None):
+    """
+    Embed every extracted image and save the matrix next to the images.
+    With `refresh_pages` (a partial re-extraction), only images on those
+    pages are embedded; the rest are copied from the existing index.
+    Returns (filenames, vectors).
+    """
+    known = {}
+    previous = load_image_index(output_dir) if refresh_pages is not None else None
+    if previous is not None:
+        known = dict(zip(*previous))
+
+    reused = {
+        i for i, img in enumerate(images)
+        if img["page"] not in (refresh_pages or ()) and img["filename"] in known
+    }
+    todo = [i for i in range(len(images)) if i not in reused]
+    # Duplicate images share one file; embed each file once
+    paths = list(dict.fromkeys(images[i]["path"] for i in todo))
+    unique = embed_images(paths)
+    rows = {path: row for row, path in enumerate(paths)}
+    fresh = unique[[rows[images[i]["path"]] for i in todo]]
+    dim = fresh.shape[1] if fresh.shape[1] else len(next(iter(known.values()), []))
+    vectors = np.zeros((len(images), dim), dtype=np.float32)
+    if todo and fresh.shape[1]:
+        vectors[todo] = fresh
+    for i in reused:
+        vectors[i] = known[images[i]["filename"]]
+
+    filenames = [img["filename"] for img in images]
+    np.savez(os.path.join(output_dir, IMAGE_INDEX_FILE), filenames=np.array(filenames), vectors=vectors)
+    logger.info(f"Image index built: {len(todo)} embedded, {len(reused)} reused")
+    return filenames, vectors
+
+
+def load_image_index(output_dir):
+    """
+    Saved (filenames, vectors) for an image folder, or None.
+    """
+    path = os.path.join(output_dir, IMAGE_INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return [str(name) for name in data["filenames"]], data["vectors"]
+
+
+def search_image_index(image_index, topic, top_k, min_score):
+    """
+    Rank images against a text topic with one matrix product.
+    Returns [(position, score)] best first, for scores >= min_score.
+    """
+    filenames, vectors = image_index
+    if not filenames or not vectors.shape[1]:
+        return []
+    query = _normalize(get_image_model().encode([topic]))[0]
+    scores = vectors @ query
+    best = np.argsort(-scores)[:top_k]
+    return [(int(i), float(scores[i])) for i in best if scores[i] >= min_score]
@@ -0,0 +1,170 @@
+import bisect
+import os
+import re
+import numpy as np
+from src.config import BM25_K1, BM25_B
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+LEXICAL_INDEX_VERSION = 1
+LEXICAL_INDEX_FILE = "lexical.npz"
+
+# Words, numbers and joined identifiers such as "ISO-9001", "4.2.1" or "A113/B"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+
+
+def tokenize(text):
+    """
+    Lowercase terms of a text. Joined identifiers are kept whole and also
+    split into their parts, so "clause 4.2.1" matches both "4.2.1" and "4".
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(re.split(r"[._/-]", token))
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over one document's chunks, stored as flat arrays.
+
+    `terms` is the sorted vocabulary (a list); the postings of terms[i] are
+    positions[indptr[i]:indptr[i + 1]] (rows into chunk_ids/lengths) with
+    matching term frequencies in `freqs`. Lookups are a binary search and
+    scoring is vectorized per query term.
+    """
+
+    def __init__(self, terms, indptr, positions, freqs, chunk_ids, lengths):
+        self.terms = terms
+        self.indptr = indptr
+        self.positions = positions
+        self.freqs = freqs
+        self.chunk_ids = chunk_ids
+        self.lengths = lengths
+
+    @classmethod
+    def build(cls, chunks):
+        """
+        Index Chunk records (anything with chunk_id and text).
+        """
+        chunk_ids, lengths, pairs = [], [], {}
+        for row, chunk in enumerate(chunks):
+            terms = tokenize(chunk.text)
+            chunk_ids.append(chunk.chunk_id)
+            lengths.append(len(terms))
+            for term in terms:
+                key = (term, row)
+                pairs[key] = pairs.get(key, 0) + 1
+
+        ordered = sorted(pairs.items())
+        vocabulary = sorted({term for term, _ in pairs})
+        term_rows = np.searchsorted(vocabulary, [term for (term, _), _ in ordered]) if ordered else []
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.add.at(indptr, np.asarray(term_rows, dtype=np.int64) + 1, 1)
+        return cls(
+            vocabulary,
+            np.cumsum(indptr),
+            np.array([row for (_, row), _ in ordered], dtype=np.int32),
+            np.array([freq for _, freq in ordered], dtype=np.float32),
+            np.array(chunk_ids, dtype=np.int64),
+            np.array(lengths, dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self.chunk_ids)
+
+    def postings(self, term):
+        """
+        (positions, freqs) of a term; empty arrays if it does not occur.
+        """
+        i = bisect.bisect_left(self.terms, term)
+        if i < len(self.terms) and self.terms[i] == term:
+            start, end = self.indptr[i], self.indptr[i + 1]
+            return self.positions[start:end], self.freqs[start:end]
+        return self.positions[:0], self.freqs[:0]
+
+    def document_frequency(self, term):
+        return len(self.postings(term)[0])
+
+    def score(self, query_terms, idf, avg_length, k1=BM25_K1, b=BM25_B):
+        """
+        BM25 score of every chunk for the query terms, given collection-wide
+        idf values (term -> idf) and average chunk length.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        norm = k1 * (1 - b + b * self.lengths / max(avg_length, 1e-9))
+        for term in query_terms:
+            positions, freqs = self.postings(term)
+            if len(positions):
+                scores[positions] += idf[term] * freqs * (k1 + 1) / (freqs + norm[positions])
+        return scores
+
+    def save(self, store_dir):
+        # The vocabulary is saved as one newline-joined UTF-8 buffer; a
+        # fixed-width string array pads every term to the longest one
+        terms = np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8)
+        np.savez(
+            os.path.join(store_dir, LEXICAL_INDEX_FILE),
+            version=LEXICAL_INDEX_VERSION, terms=terms, indptr=self.indptr, positions=self.positions,
+            freqs=self.freqs, chunk_ids=self.chunk_ids, lengths=self.lengths,
+        )
+
+    @classmethod
+    def load(cls, store_dir):
+        """
+        Saved index of a document store, or None if missing or outdated.
+        """
+        path = os.path.join(store_dir, LEXICAL_INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != LEXICAL_INDEX_VERSION:
+                return None
+            text = data["terms"].tobytes().decode("utf-8")
+            terms = text.split("\n") if text else []
+            return cls(terms, data["indptr"], data["positions"], data["freqs"],
+                       data["chunk_ids"], data["lengths"])
+
+
+def search_lexical(indexes, query, top_k, allowed=None):
+    """
+    BM25 search over several documents' indexes with collection-wide
+    statistics. `indexes` maps doc_id -> LexicalIndex; `allowed` optionally
+    maps doc_id -> chunk ids to restrict the search to.
+    Returns [(doc_id, chunk_id, score)] best first.
+    """
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    total_chunks = sum(len(index) for index in indexes.values())
+    if not query_terms or not total_chunks:
+        return []
+    avg_length = sum(float(index.lengths.sum()) for index in indexes.values()) / total_chunks
+    idf = {}
+    for term in query_terms:
+        df = sum(index.document_frequency(term) for index in indexes.values())
+        idf[term] = np.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+
+    results = []
+    for doc_id, index in indexes.items():
+        scores = index.score(query_terms, idf, avg_length)
+        if allowed is not None:
+            scores[~np.isin(index.chunk_ids, list(allowed.get(doc_id, ())))] = 0
+        hits = np.flatnonzero(scores > 0)
+        best = hits[np.argsort(-scores[hits])[:top_k]]
+        results.extend((doc_id, int(index.chunk_ids[row]), float(scores[row])) for row in best)
+    results.sort(key=lambda hit: -hit[2])
+    return results[:top_k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked lists of hashable ids; an id scores sum(1 / (k + rank)).
+    Returns ids best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: -scores[item])
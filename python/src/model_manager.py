@@ -1,5 +1,5 @@
-import requests
 from src.config import OLLAMA_MODEL,VISION_MODEL, VISION_MODEL_FALLBACK, AUTO_FALLBACK
+from src.ollama_client import get_client
 from src.utils import setup_logging
 
 logger = setup_logging()
@@ -13,7 +13,7 @@ class ModelManager:
         List all available Ollama models.
         """
         try:
-            response = requests.get("http://localhost:11434/api/tags")
+            response = get_client().tags()
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 
@@ -58,7 +58,7 @@ class ModelManager:
         """
         # Check if model exists
         try:
-            response = requests.get("http://localhost:11434/api/tags")
+            response = get_client().tags()
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 model_names = [m.get("name", "") for m in models]
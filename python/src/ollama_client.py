@@ -0,0 +1,432 @@
+import asyncio
+import json
+import threading
+import time
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+from src.config import (
+    OLLAMA_BASE_URL, OLLAMA_TIMEOUTS, OLLAMA_POOL_SIZE, OLLAMA_RETRIES, OLLAMA_RETRY_BACKOFF
+)
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+class _ClientMetrics:
+    """
+    Per-endpoint call counts, error counts and latency shared by the
+    blocking and asyncio clients.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _record(self, endpoint, seconds, failed):
+        with self._lock:
+            stats = self._metrics.setdefault(
+                endpoint, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def _record_prompt_eval(self, result):
+        """
+        Record the prompt-evaluation time Ollama reports for a chat call.
+        Prompt tokens found in the model's cache are not evaluated again,
+        so this drops when prompts share a stable prefix.
+        """
+        if "prompt_eval_duration" in result:
+            self._record("chat_prompt_eval", result["prompt_eval_duration"] / 1e9, False)
+
+    def stats(self):
+        """
+        Per-endpoint call counts, error counts and latency (seconds).
+        """
+        with self._lock:
+            return {
+                endpoint: dict(stats, avg_seconds=round(stats["total_seconds"] / stats["calls"], 3))
+                for endpoint, stats in self._metrics.items()
+            }
+
+
+def _parse_chat_line(line):
+    """
+    One newline-delimited JSON message of a streamed /api/chat response,
+    or None for a blank line. Raises ValueError on an error message.
+    """
+    if not line:
+        return None
+    message = json.loads(line)
+    if "error" in message:
+        raise ValueError(message["error"])
+    return message
+
+
+def _parse_sse_line(line):
+    """
+    Text of one server-sent event line from /v1/completions; None at "[DONE]".
+    """
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("text", "")
+
+
+def _stream_lines(response):
+    """
+    Decoded lines of a streamed response. A read timeout partway through
+    the body is raised as requests.ReadTimeout (requests wraps it in a
+    ConnectionError) and any other dropped connection as
+    ChunkedEncodingError.
+    """
+    try:
+        yield from response.iter_lines(decode_unicode=True)
+    except requests.exceptions.ConnectionError as e:
+        if e.args and isinstance(e.args[0], ReadTimeoutError):
+            raise requests.exceptions.ReadTimeout(e, response=response) from e
+        raise requests.exceptions.ChunkedEncodingError(e, response=response) from e
+
+
+class OllamaClient(_ClientMetrics):
+    """
+    Thin HTTP client for the local Ollama server.
+
+    One pooled requests.Session keeps connections alive across chat,
+    vision and model-listing calls. Connection failures and 502/503/504
+    responses are retried with exponential backoff; timeouts are set per
+    endpoint and every call's latency is recorded.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, timeouts=OLLAMA_TIMEOUTS, pool_size=OLLAMA_POOL_SIZE,
+                 retries=OLLAMA_RETRIES, backoff=OLLAMA_RETRY_BACKOFF):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = timeouts
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # a timed-out generation is not worth repeating
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, endpoint, **kwargs):
+        """
+        Send a request to `path` using the timeout configured for `endpoint`.
+        """
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, self.timeouts["default"]))
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            seconds = time.perf_counter() - started
+            self._record(endpoint, seconds, failed)
+            logger.debug(f"Ollama {endpoint} took {seconds:.3f}s")
+
+    def completions(self, payload, **kwargs):
+        """
+        OpenAI-compatible text completion (/v1/completions).
+        """
+        return self.request("POST", "/v1/completions", "completions", json=payload, **kwargs)
+
+    def stream_completions(self, payload, **kwargs):
+        """
+        Stream a /v1/completions request, yielding text pieces as Ollama
+        produces them. Time to first token is recorded under
+        "completions_first_token". Raises requests.HTTPError on error status,
+        ReadTimeout or ChunkedEncodingError if the stream breaks off.
+        """
+        started = time.perf_counter()
+        response = self.request(
+            "POST", "/v1/completions", "completions", json=dict(payload, stream=True), stream=True, **kwargs
+        )
+        with response:
+            if response.status_code != 200:
+                raise requests.HTTPError(f"Ollama error {response.status_code}: {response.text}", response=response)
+            response.encoding = "utf-8"
+            first_token = True
+            for line in _stream_lines(response):
+                # Server-sent events: "data: {json}" lines, ending with "data: [DONE]"
+                text = _parse_sse_line(line)
+                if text is None:
+                    break
+                if text:
+                    if first_token:
+                        self._record("completions_first_token", time.perf_counter() - started, False)
+                        first_token = False
+                    yield text
+            else:
+                raise requests.exceptions.ChunkedEncodingError("Ollama closed the stream before [DONE]", response=response)
+
+    def chat(self, payload, **kwargs):
+        """
+        Native chat endpoint (/api/chat); prompt-eval time is recorded
+        under "chat_prompt_eval".
+        """
+        response = self.request("POST", "/api/chat", "chat", json=dict(payload, stream=False), **kwargs)
+        if response.status_code == 200:
+            self._record_prompt_eval(response.json())
+        return response
+
+    def stream_chat(self, payload, **kwargs):
+        """
+        Stream an /api/chat request, yielding text pieces as Ollama produces
+        them. Time to first token is recorded under "chat_first_token".
+        Raises requests.HTTPError on error status or an error message,
+        ReadTimeout or ChunkedEncodingError if the stream breaks off.
+        """
+        started = time.perf_counter()
+        response = self.request(
+            "POST", "/api/chat", "chat", json=dict(payload, stream=True), stream=True, **kwargs
+        )
+        with response:
+            if response.status_code != 200:
+                raise requests.HTTPError(f"Ollama error {response.status_code}: {response.text}", response=response)
+            response.encoding = "utf-8"
+            first_token = True
+            for line in _stream_lines(response):
+                try:
+                    message = _parse_chat_line(line)
+                except ValueError as e:
+                    raise requests.HTTPError(f"Ollama error: {e}", response=response)
+                if message is None:
+                    continue
+                if message.get("done"):
+                    self._record_prompt_eval(message)
+                    break
+                text = message.get("message", {}).get("content", "")
+                if text:
+                    if first_token:
+                        self._record("chat_first_token", time.perf_counter() - started, False)
+                        first_token = False
+                    yield text
+            else:
+                raise requests.exceptions.ChunkedEncodingError("Ollama closed the stream before it was done", response=response)
+
+    def generate(self, payload, **kwargs):
+        """
+        Native generation endpoint (/api/generate), used for vision models.
+        """
+        return self.request("POST", "/api/generate", "generate", json=payload, **kwargs)
+
+    def tags(self, **kwargs):
+        """
+        List locally installed models (/api/tags).
+        """
+        return self.request("GET", "/api/tags", "tags", **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncOllamaClient(_ClientMetrics):
+    """
+    asyncio counterpart of OllamaClient built on httpx.AsyncClient.
+
+    In-flight calls only hold a pooled connection, not a thread, so one
+    event loop can serve many chat sessions at once. Timeouts, retries on
+    connection errors and 502/503/504, and latency metrics match the
+    blocking client.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, timeouts=OLLAMA_TIMEOUTS, pool_size=OLLAMA_POOL_SIZE,
+                 retries=OLLAMA_RETRIES, backoff=OLLAMA_RETRY_BACKOFF):
+        super().__init__()
+        self.timeouts = timeouts
+        self.retries = retries
+        self.backoff = backoff
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            limits=limits,
+            # Calls beyond the pool size queue for a connection instead of failing
+            transport=httpx.AsyncHTTPTransport(limits=limits, retries=retries),
+        )
+
+    def _timeout(self, endpoint):
+        connect, read = self.timeouts.get(endpoint, self.timeouts["default"])
+        return httpx.Timeout(read, connect=connect, pool=None)
+
+    async def request(self, method, path, endpoint, **kwargs):
+        """
+        Send a request to `path` using the timeout configured for `endpoint`.
+        """
+        kwargs.setdefault("timeout", self._timeout(endpoint))
+        started = time.perf_counter()
+        failed = True
+        try:
+            for attempt in range(self.retries + 1):
+                response = await self.client.request(method, path, **kwargs)
+                if response.status_code not in (502, 503, 504) or attempt == self.retries:
+                    break
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            failed = response.status_code >= 400
+            return response
+        finally:
+            seconds = time.perf_counter() - started
+            self._record(endpoint, seconds, failed)
+            logger.debug(f"Ollama {endpoint} took {seconds:.3f}s")
+
+    async def completions(self, payload, **kwargs):
+        """
+        OpenAI-compatible text completion (/v1/completions).
+        """
+        return await self.request("POST", "/v1/completions", "completions", json=payload, **kwargs)
+
+    async def stream_completions(self, payload):
+        """
+        Stream a /v1/completions request, yielding text pieces as they arrive.
+        Raises httpx.HTTPStatusError on error status, ReadTimeout or a
+        TransportError if the stream breaks off.
+        """
+        started = time.perf_counter()
+        first_token = True
+        request = self.client.build_request(
+            "POST", "/v1/completions", json=dict(payload, stream=True), timeout=self._timeout("completions")
+        )
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError:
+            self._record("completions", time.perf_counter() - started, True)
+            raise
+        self._record("completions", time.perf_counter() - started, response.status_code != 200)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                raise httpx.HTTPStatusError(
+                    f"Ollama error {response.status_code}: {response.text}", request=request, response=response
+                )
+            async for line in response.aiter_lines():
+                text = _parse_sse_line(line)
+                if text is None:
+                    break
+                if text:
+                    if first_token:
+                        self._record("completions_first_token", time.perf_counter() - started, False)
+                        first_token = False
+                    yield text
+            else:
+                raise httpx.RemoteProtocolError("Ollama closed the stream before [DONE]", request=request)
+        finally:
+            await response.aclose()
+
+    async def chat(self, payload, **kwargs):
+        """
+        Native chat endpoint (/api/chat); prompt-eval time is recorded
+        under "chat_prompt_eval".
+        """
+        response = await self.request("POST", "/api/chat", "chat", json=dict(payload, stream=False), **kwargs)
+        if response.status_code == 200:
+            self._record_prompt_eval(response.json())
+        return response
+
+    async def stream_chat(self, payload):
+        """
+        Stream an /api/chat request, yielding text pieces as they arrive.
+        Raises httpx.HTTPStatusError on error status or an error message,
+        ReadTimeout or a TransportError if the stream breaks off.
+        """
+        started = time.perf_counter()
+        first_token = True
+        request = self.client.build_request(
+            "POST", "/api/chat", json=dict(payload, stream=True), timeout=self._timeout("chat")
+        )
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError:
+            self._record("chat", time.perf_counter() - started, True)
+            raise
+        self._record("chat", time.perf_counter() - started, response.status_code != 200)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                raise httpx.HTTPStatusError(
+                    f"Ollama error {response.status_code}: {response.text}", request=request, response=response
+                )
+            async for line in response.aiter_lines():
+                try:
+                    message = _parse_chat_line(line)
+                except ValueError as e:
+                    raise httpx.HTTPStatusError(f"Ollama error: {e}", request=request, response=response)
+                if message is None:
+                    continue
+                if message.get("done"):
+                    self._record_prompt_eval(message)
+                    break
+                text = message.get("message", {}).get("content", "")
+                if text:
+                    if first_token:
+                        self._record("chat_first_token", time.perf_counter() - started, False)
+                        first_token = False
+                    yield text
+            else:
+                raise httpx.RemoteProtocolError("Ollama closed the stream before it was done", request=request)
+        finally:
+            await response.aclose()
+
+    async def generate(self, payload, **kwargs):
+        """
+        Native generation endpoint (/api/generate), used for vision models.
+        """
+        return await self.request("POST", "/api/generate", "generate", json=payload, **kwargs)
+
+    async def tags(self, **kwargs):
+        """
+        List locally installed models (/api/tags).
+        """
+        return await self.request("GET", "/api/tags", "tags", **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide OllamaClient.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient()
+    return _client
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Return the AsyncOllamaClient of the running event loop. httpx
+    connections belong to the loop that opened them, so each loop gets
+    its own pooled client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncOllamaClient()
+    return client
@@ -0,0 +1,87 @@
+import os
+import mmap
+import hashlib
+import PyPDF2
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+class PDFDocument:
+    """
+    One open PDF shared by every ingest step.
+
+    The file is memory-mapped once. Its content hash, the PyMuPDF document
+    (page count, fingerprints, images and pymupdf text) and the PyPDF2
+    reader (pypdf2 text) are built from that mapping on first use and
+    reused, instead of each step reopening and re-parsing the file.
+    Use as a context manager, or call close().
+    """
+
+    def __init__(self, pdf_path):
+        self.path = pdf_path
+        self._file = open(pdf_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = None
+        self._fitz_doc = None
+        self._reader = None
+        self._hash = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def size(self):
+        return len(self._map)
+
+    @property
+    def content_hash(self):
+        """
+        sha1 of the file bytes; same value as doc_store.file_fingerprint.
+        """
+        if self._hash is None:
+            self._hash = hashlib.sha1(self._map).hexdigest()
+        return self._hash
+
+    @property
+    def fitz_doc(self):
+        if self._fitz_doc is None:
+            import fitz
+            self._view = memoryview(self._map)
+            self._fitz_doc = fitz.open(stream=self._view, filetype="pdf")
+        return self._fitz_doc
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = PyPDF2.PdfReader(self._map)
+        return self._reader
+
+    @property
+    def page_count(self):
+        return len(self.fitz_doc)
+
+    def info(self):
+        """
+        Basic file metadata shown to the user and the LLM.
+        """
+        return {
+            "file_name": os.path.basename(self.path),
+            "page_count": self.page_count,
+            "file_size_kb": round(self.size / 1024, 2),
+            "format": "PDF Document",
+        }
+
+    def close(self):
+        if self._fitz_doc is not None:
+            self._fitz_doc.close()
+            self._fitz_doc = None
+        self._reader = None
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        self._map.close()
+        self._file.close()
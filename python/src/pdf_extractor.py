@@ -1,11 +1,177 @@
+import os
+import hashlib
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 import PyPDF2
+from src.config import EXTRACT_BACKEND, EXTRACT_WORKERS, EXTRACT_MIN_PAGES_PER_SHARD
 
-def extract_text(pdf_path):
-    text = ""
+BACKENDS = ("pypdf2", "pymupdf")
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown extraction backend '{backend}'. Choose one of {BACKENDS}")
+
+
+def get_page_count(pdf_path, backend=EXTRACT_BACKEND):
+    """
+    Return the number of pages in the PDF using the selected backend.
+    """
+    _check_backend(backend)
+    if backend == "pymupdf":
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _iter_page_range(pdf_path, backend, start, end, document=None):
+    """
+    Yield the text of pages [start, end) one page at a time, from the
+    already parsed PDFDocument when one is given.
+    """
+    if document is not None:
+        if backend == "pymupdf":
+            for i in range(start, end):
+                yield document.fitz_doc[i].get_text() or ""
+        else:
+            for i in range(start, end):
+                yield document.reader.pages[i].extract_text() or ""
+        return
+    if backend == "pymupdf":
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            for i in range(start, end):
+                yield doc[i].get_text() or ""
+        return
     with open(pdf_path, "rb") as f:
         reader = PyPDF2.PdfReader(f)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+        for i in range(start, end):
+            yield reader.pages[i].extract_text() or ""
+
+
+def _extract_page_range(args):
+    """
+    Extract text for pages [start, end). Runs inside a worker process,
+    so the document is opened independently per shard.
+    """
+    pdf_path, backend, start, end = args
+    return list(_iter_page_range(pdf_path, backend, start, end))
+
+
+def _page_shards(page_count, workers):
+    """
+    Split the page range into contiguous shards. A few shards per worker
+    keeps the pool busy when some pages are much heavier than others.
+    """
+    shard_size = max(EXTRACT_MIN_PAGES_PER_SHARD, -(-page_count // (workers * 4)))
+    return [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+
+def iter_pages(pdf_path, backend=EXTRACT_BACKEND, workers=EXTRACT_WORKERS, first_page=1, last_page=None,
+               document=None):
+    """
+    Yield page texts in page order as soon as they are extracted.
+    Only a couple of shards per worker are in flight at once, so memory
+    stays bounded no matter how many pages the PDF has.
+    first_page/last_page (1-based, inclusive) limit extraction to a page range.
+    An open PDFDocument is reused for in-process extraction; worker
+    processes always open the file themselves.
+    """
+    _check_backend(backend)
+    workers = workers or os.cpu_count() or 1
+    page_count = document.page_count if document is not None else get_page_count(pdf_path, backend)
+    first = first_page - 1
+    last = min(last_page or page_count, page_count)
+    shards = [(first + start, first + end) for start, end in _page_shards(max(last - first, 0), workers)]
+
+    if workers == 1 or len(shards) <= 1:
+        yield from _iter_page_range(pdf_path, backend, first, last, document)
+        return
+
+    shard_args = [(pdf_path, backend, start, end) for start, end in shards]
+    for shard_pages in iter_sharded(_extract_page_range, shard_args, workers):
+        yield from shard_pages
+
+
+def iter_sharded(fn, shard_args, workers):
+    """
+    Run fn over each shard's arguments in a process pool and yield the
+    results in shard order. Only two shards per worker are in flight at
+    once, so memory stays bounded however many shards there are.
+    """
+    max_in_flight = workers * 2
+    remaining = iter(shard_args)
+    with ProcessPoolExecutor(max_workers=min(workers, len(shard_args))) as executor:
+        pending = deque(executor.submit(fn, args) for args in islice(remaining, max_in_flight))
+        while pending:
+            result = pending.popleft().result()
+            next_args = next(remaining, None)
+            if next_args is not None:
+                pending.append(executor.submit(fn, next_args))
+            yield result
+
+
+def extract_pages(pdf_path, backend=EXTRACT_BACKEND, workers=EXTRACT_WORKERS):
+    """
+    Extract text page by page, sharding the page range across a process pool.
+    Returns a list with one string per page, in page order.
+    """
+    return list(iter_pages(pdf_path, backend, workers))
+
+
+def page_fingerprints(pdf_path, document=None):
+    """
+    Cheap per-page content hashes used to detect which pages of a revised
+    PDF changed. Hashes the raw page content stream, page size and image
+    properties; no text extraction or layout happens.
+    """
+    if document is None:
+        import fitz
+        with fitz.open(pdf_path) as doc:
+            return _page_fingerprints(doc)
+    return _page_fingerprints(document.fitz_doc)
+
+
+def _page_fingerprints(doc):
+    fingerprints = []
+    for page in doc:
+        digest = hashlib.sha1(page.read_contents())
+        digest.update(repr(tuple(page.rect)).encode())
+        for img in page.get_images(full=True):
+            # (name, width, height, bpc, colorspace, filter); xrefs change on re-save
+            digest.update(repr((img[7], img[2], img[3], img[4], img[5], img[8])).encode())
+        fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+
+def join_pages(pages):
+    """
+    Join page texts into one document string.
+    Returns (text, page_offsets) where page_offsets[i] is the character
+    offset at which page i+1 starts in text.
+    """
+    parts = []
+    page_offsets = []
+    position = 0
+    for page_text in pages:
+        page_offsets.append(position)
+        if page_text:
+            parts.append(page_text)
+            parts.append("\n")
+            position += len(page_text) + 1
+    return "".join(parts), page_offsets
+
+
+def extract_text_with_offsets(pdf_path, backend=EXTRACT_BACKEND, workers=EXTRACT_WORKERS):
+    """
+    Extract the full document text along with per-page character offsets.
+    """
+    return join_pages(extract_pages(pdf_path, backend, workers))
+
+
+def extract_text(pdf_path, backend=EXTRACT_BACKEND, workers=EXTRACT_WORKERS):
+    text, _ = extract_text_with_offsets(pdf_path, backend, workers)
     return text
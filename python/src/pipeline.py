@@ -0,0 +1,153 @@
+import queue
+import threading
+from src.chunker import iter_chunks, iter_token_chunks
+from src.embedder import embed_text, flush_embedding_cache, get_tokenizer, get_max_tokens
+from src.pdf_extractor import iter_pages
+from src.config import (
+    CHUNK_MODE, CHUNK_SIZE, CHUNK_OVERLAP, CHUNK_TOKENS, CHUNK_TOKEN_OVERLAP,
+    EMBED_BATCH_SIZE, PIPELINE_QUEUE_SIZE
+)
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+
+class _End:
+    """
+    Marks the end of a background stream, carrying the producer's error if any.
+    """
+    def __init__(self, error=None):
+        self.error = error
+
+
+def run_in_background(iterable, maxsize=PIPELINE_QUEUE_SIZE):
+    """
+    Drive `iterable` on a background thread and yield its items through a
+    bounded queue. The producer blocks once `maxsize` items are waiting,
+    which keeps memory flat while letting stages overlap.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_End(e))
+            return
+        put(_End())
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if isinstance(item, _End):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+
+def batched(iterable, batch_size):
+    """
+    Group items from `iterable` into lists of at most `batch_size`.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def chunk_pages(pages, mode=CHUNK_MODE, first_page=1, start_offset=0, first_chunk_id=0):
+    """
+    Chunk a page stream with the configured strategy.
+    "tokens" sizes chunks to the embedding model's window using its
+    tokenizer; "words" uses fixed word windows.
+    """
+    position = (first_page, start_offset, first_chunk_id)
+    if mode == "tokens":
+        max_tokens = CHUNK_TOKENS or get_max_tokens()
+        return iter_token_chunks(pages, get_tokenizer(), max_tokens, CHUNK_TOKEN_OVERLAP, *position)
+    if mode == "words":
+        return iter_chunks(pages, CHUNK_SIZE, CHUNK_OVERLAP, *position)
+    raise ValueError(f"Unknown chunking mode '{mode}'. Use 'tokens' or 'words'.")
+
+
+def record_lengths(pages, page_lengths):
+    """
+    Pass pages through, appending each page's text length to page_lengths.
+    """
+    for page_text in pages:
+        page_lengths.append(len(page_text))
+        yield page_text
+
+
+def skip_chars(pages, count):
+    """
+    Pass pages through with the first `count` characters of the first one dropped.
+    """
+    for page_text in pages:
+        yield page_text[count:]
+        count = 0
+
+
+def take_until(chunks, until):
+    """
+    Pass chunks through, stopping before the first one for which until(chunk) is true.
+    """
+    for chunk in chunks:
+        if until(chunk):
+            return
+        yield chunk
+
+
+def iter_embedded_batches(pdf_path, mode=CHUNK_MODE, batch_size=EMBED_BATCH_SIZE, first_page=1, last_page=None,
+                          start_offset=0, first_chunk_id=0, page_lengths=None, document=None,
+                          skip=0, until=None):
+    """
+    Stream (chunks, embeddings) batches for a PDF, or for pages
+    first_page..last_page of it when re-indexing part of a document.
+    Page extraction and embedding run on separate threads connected by
+    bounded queues: pages -> chunks -> embedding batches. If page_lengths
+    is a list, the text length of every extracted page is appended to it.
+    `document` is an open PDFDocument to extract from instead of reopening the file.
+    `skip` starts chunking that many characters into first_page (at a known
+    chunk start), and the stream ends before the first chunk for which
+    until(chunk) is true.
+    """
+    pages = iter_pages(pdf_path, first_page=first_page, last_page=last_page, document=document)
+    if page_lengths is not None:
+        pages = record_lengths(pages, page_lengths)
+    if skip:
+        pages = skip_chars(pages, skip)
+    pages = run_in_background(pages)
+    chunks = chunk_pages(pages, mode, first_page, start_offset + skip, first_chunk_id)
+    if until is not None:
+        chunks = take_until(chunks, until)
+    chunk_batches = batched(chunks, batch_size)
+    embedded = ((batch, embed_text([chunk.text for chunk in batch])) for batch in chunk_batches)
+    try:
+        yield from run_in_background(embedded)
+    finally:
+        pages.close()  # stops extraction when the stream ended early
+    flush_embedding_cache()
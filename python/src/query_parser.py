@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 def parse_image_query(query):
     """
@@ -34,4 +35,28 @@ def parse_image_query(query):
         elif page_num:
             return ("analyze_page", page_num, None)
     
-    return (None, None, None)
\ No newline at end of file
+    return (None, None, None)
+
+def parse_page_filter(query):
+    """
+    Find a page restriction in a text question, e.g. "on page 12" or "pages 3-5".
+    Returns (first_page, last_page) or None.
+    """
+    query_lower = query.lower()
+    range_match = re.search(r'pages\s+(\d+)\s*(?:-|to|through)\s*(\d+)', query_lower)
+    if range_match:
+        first, last = int(range_match.group(1)), int(range_match.group(2))
+        return (min(first, last), max(first, last))
+
+    page_match = re.search(r'\bpage\s+(\d+)', query_lower)
+    if page_match:
+        page_num = int(page_match.group(1))
+        return (page_num, page_num)
+
+    return None
+
+def normalize_query(query):
+    """
+    Case- and whitespace-insensitive form of a question, used as a cache key.
+    """
+    return " ".join(unicodedata.normalize("NFC", query).lower().split())
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from src.config import RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_CACHE_MAX_ENTRIES
+from src.query_parser import normalize_query
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+_model = None
+_model_lock = threading.Lock()
+_scores = OrderedDict()  # (normalized query, chunk key) -> score, least recently used first
+_scores_lock = threading.Lock()
+_stats = {"queries": 0, "pairs_scored": 0, "pairs_cached": 0, "total_ms": 0.0, "last_ms": 0.0}
+
+
+def get_reranker():
+    """
+    Return the process-wide cross-encoder, loaded on first use like the
+    text embedder.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                from sentence_transformers import CrossEncoder
+                _model = CrossEncoder(RERANK_MODEL, device="cpu")
+                logger.info(f"Loaded reranking model {RERANK_MODEL} in {time.perf_counter() - started:.2f}s")
+    return _model
+
+
+def rerank(query, candidates, top_k, batch_size=RERANK_BATCH_SIZE):
+    """
+    Reorder retrieval candidates by cross-encoder relevance to the query.
+
+    `candidates` is a list of (key, text) pairs where key identifies the
+    chunk content, e.g. (doc_id, chunk_id). Scores are cached per
+    (normalized query, key), so only unseen pairs reach the model, in
+    batches. Returns the top_k keys, best first.
+    """
+    started = time.perf_counter()
+    normalized = normalize_query(query)
+    scores = {}
+    with _scores_lock:
+        for key, _ in candidates:
+            score = _scores.get((normalized, key))
+            if score is not None:
+                _scores.move_to_end((normalized, key))
+                scores[key] = score
+
+    missing = [(key, text) for key, text in candidates if key not in scores]
+    if missing:
+        predicted = get_reranker().predict(
+            [(query, text) for _, text in missing], batch_size=batch_size, show_progress_bar=False
+        )
+        with _scores_lock:
+            for (key, _), score in zip(missing, predicted):
+                scores[key] = _scores[(normalized, key)] = float(score)
+            while len(_scores) > RERANK_CACHE_MAX_ENTRIES:
+                _scores.popitem(last=False)
+
+    ranked = sorted((key for key, _ in candidates), key=lambda key: -scores[key])[:top_k]
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    with _scores_lock:
+        _stats["queries"] += 1
+        _stats["pairs_scored"] += len(missing)
+        _stats["pairs_cached"] += len(candidates) - len(missing)
+        _stats["total_ms"] += elapsed_ms
+        _stats["last_ms"] = elapsed_ms
+    logger.info(f"Reranked {len(candidates)} candidates ({len(missing)} scored) in {elapsed_ms:.1f}ms")
+    return ranked
+
+
+def get_rerank_stats():
+    """
+    Query count, scored vs cached pairs and latency (ms) added by reranking.
+    """
+    with _scores_lock:
+        queries = _stats["queries"]
+        return {
+            "queries": queries,
+            "pairs_scored": _stats["pairs_scored"],
+            "pairs_cached": _stats["pairs_cached"],
+            "last_ms": round(_stats["last_ms"], 1),
+            "mean_ms": round(_stats["total_ms"] / queries, 1) if queries else 0.0,
+            "cache_entries": len(_scores),
+        }
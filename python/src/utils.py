@@ -14,13 +14,17 @@ def setup_logging(log_file="logs/chat.log"):
     )
     return logging.getLogger(__name__)
 
-def save_metadata(data, file_path):
+def save_metadata(data, file_path, compact=False):
     """
-    Save data (e.g., image metadata) to a JSON file.
+    Save data (e.g., image metadata) to a JSON file. compact=True drops
+    the indentation, for large machine-read indexes.
     """
     try:
         with open(file_path, "w") as f:
-            json.dump(data, f, indent=4)
+            if compact:
+                json.dump(data, f, separators=(",", ":"))
+            else:
+                json.dump(data, f, indent=4)
         logger = logging.getLogger(__name__)
         logger.info(f"Metadata saved to {file_path}")
     except Exception as e:
@@ -1,23 +1,224 @@
+import math
+import time
 import faiss
 import numpy as np
 import os
+from src.config import INDEX_TYPE, INDEX_NPROBE, INDEX_EF_SEARCH, INDEX_HNSW_M, INDEX_PQ_M, INDEX_AUTO_THRESHOLDS
+from src.utils import setup_logging
 
-EMBEDDING_DIM = 384  # Must match SentenceTransformer output
+logger = setup_logging()
 
-def create_index(embeddings):
-    index = faiss.IndexFlatL2(EMBEDDING_DIM)
-    index.add(np.array(embeddings))
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def choose_index_type(num_vectors):
+    """
+    Pick an index type for a corpus of `num_vectors` vectors.
+    Exact search is fast enough for small corpora; IVF trades a little
+    recall for much faster search, and PQ also compresses the vectors.
+    """
+    if num_vectors < INDEX_AUTO_THRESHOLDS["ivf_flat"]:
+        return "flat"
+    if num_vectors < INDEX_AUTO_THRESHOLDS["ivf_pq"]:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _pq_subquantizers(dim):
+    """
+    Largest PQ sub-quantizer count <= INDEX_PQ_M that divides dim.
+    """
+    return max(m for m in range(1, min(INDEX_PQ_M, dim) + 1) if dim % m == 0)
+
+
+def _pq_bits(num_vectors):
+    """
+    Bits per PQ code: each codebook has 2**nbits centroids to train from at
+    least 39 points each, so small corpora get fewer bits.
+    """
+    return min(8, int(math.log2(max(num_vectors // 39, 1))))
+
+
+def resolve_index_type(index_type, num_vectors):
+    """
+    The index type actually built for `num_vectors` vectors: "auto" picks by
+    size, and ivf_pq becomes ivf_flat when there are too few vectors to
+    train even 16 centroids per codebook.
+    """
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+    if index_type == "ivf_pq" and _pq_bits(num_vectors) < 4:
+        logger.info(f"Only {num_vectors} vectors; using ivf_flat instead of ivf_pq")
+        return "ivf_flat"
+    return index_type
+
+
+def _factory_string(index_type, num_vectors, dim):
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{INDEX_HNSW_M}"
+    # ~4*sqrt(n) lists, but keep at least 39 training points per list
+    nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{_pq_subquantizers(dim)}x{_pq_bits(num_vectors)}"
+    raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES} or 'auto'")
+
+
+def set_search_params(index, nprobe=INDEX_NPROBE, ef_search=INDEX_EF_SEARCH):
+    """
+    Apply query-time tuning knobs: nprobe for IVF indexes, efSearch for HNSW.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    hnsw = _hnsw_base(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    elif hnsw is not None:
+        hnsw.hnsw.efSearch = ef_search
     return index
 
+
+def _hnsw_base(index):
+    """
+    Return the IndexHNSW inside `index` (possibly wrapped in an id map), or None.
+    """
+    base = faiss.downcast_index(index)
+    if isinstance(base, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        base = faiss.downcast_index(base.index)
+    return base if isinstance(base, faiss.IndexHNSW) else None
+
+
+def _selector_params(index, ids):
+    """
+    Search parameters restricting results to `ids` (a list, or a range of
+    consecutive ids), keeping the index's own nprobe/efSearch settings.
+    """
+    if isinstance(ids, range) and ids.step == 1:
+        selector = faiss.IDSelectorRange(ids.start, ids.stop)
+    else:
+        selector = faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64))
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    hnsw = _hnsw_base(index)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def create_index(embeddings, index_type=INDEX_TYPE, ids=None):
+    """
+    Build an index over `embeddings`. The dimension comes from the
+    embeddings themselves; index_type is one of INDEX_TYPES or "auto".
+    With `ids`, vectors are stored under those 64-bit ids instead of their
+    insertion position: IVF indexes keep ids natively (so removing ids
+    stays correct), flat and HNSW indexes are wrapped in an IndexIDMap2.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    num_vectors, dim = embeddings.shape
+    index_type = resolve_index_type(index_type, num_vectors)
+
+    factory = _factory_string(index_type, num_vectors, dim)
+    if ids is not None and index_type in ("flat", "hnsw"):
+        factory = "IDMap2," + factory
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        started = time.perf_counter()
+        index.train(embeddings)
+        logger.info(f"Trained {index_type} index on {num_vectors} vectors in {time.perf_counter() - started:.2f}s")
+    if ids is None:
+        index.add(embeddings)
+    else:
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+    return set_search_params(index)
+
 def save_index(index, file_path="embeddings/index.faiss"):
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
     faiss.write_index(index, file_path)
 
 def load_index(file_path="embeddings/index.faiss"):
     if os.path.exists(file_path):
-        return faiss.read_index(file_path)
+        return set_search_params(faiss.read_index(file_path))
     return None
 
-def search_index(index, query_embedding, top_k=3):
-    distances, indices = index.search(np.array([query_embedding]), top_k)
-    return indices[0]
+def search_index(index, query_embedding, top_k=3, ids=None):
+    """
+    Return the ids of the top_k nearest vectors.
+    If ids is given (a list or range), only those vectors are considered.
+    """
+    query = np.array([query_embedding], dtype=np.float32)
+    if ids is None:
+        distances, indices = index.search(query, top_k)
+    else:
+        params = _selector_params(index, ids)
+        distances, indices = index.search(query, min(top_k, len(ids)), params=params)
+    return [i for i in indices[0] if i >= 0]
+
+def index_kind(index):
+    """
+    Which of INDEX_TYPES an index is.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+    return "hnsw" if _hnsw_base(index) is not None else "flat"
+
+def index_contents(index):
+    """
+    (ids, vectors) of an index built with explicit ids, for rebuilding it
+    as another type. PQ vectors come back decoded, so approximately.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        ids = faiss.vector_to_array(index.id_map)
+        return ids, faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+    invlists = ivf.invlists
+    ids = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+        faiss.rev_swig_ptr(invlists.get_ids(i), invlists.list_size(i)).copy()
+        for i in range(ivf.nlist) if invlists.list_size(i)
+    ])
+    ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+    try:
+        return ids, ivf.reconstruct_batch(ids)
+    finally:
+        ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+
+def recall_report(embeddings, queries, top_k=10, index_types=INDEX_TYPES):
+    """
+    Compare recall@top_k and query latency of each index type against the
+    exact flat baseline. Returns one dict per index type and logs a table.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    report = []
+    truth = None
+    for index_type in ("flat",) + tuple(t for t in index_types if t != "flat"):
+        started = time.perf_counter()
+        try:
+            index = create_index(embeddings, index_type)
+        except RuntimeError as e:
+            logger.warning(f"Skipping {index_type}: cannot train it on {len(embeddings)} vectors ({e})")
+            continue
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, found = index.search(queries, top_k)
+        latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        if truth is None:
+            truth = found
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(len(queries)))
+        report.append({
+            "index_type": index_type,
+            "recall": round(hits / truth.size, 4),
+            "latency_ms": round(latency_ms, 3),
+            "build_seconds": round(build_seconds, 2),
+        })
+
+    logger.info(f"Recall@{top_k} vs flat baseline ({len(embeddings)} vectors, {len(queries)} queries):")
+    for row in report:
+        logger.info(f"  {row['index_type']:<9} recall={row['recall']:.4f}  "
+                    f"latency={row['latency_ms']:.3f} ms/query  build={row['build_seconds']:.2f}s")
+    return report
@@ -0,0 +1,139 @@
+import os
+import hashlib
+import json
+import threading
+from src.config import VISION_CACHE_ENABLED, VISION_CACHE_DIR, VISION_CACHE_MAX_ENTRIES
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+
+def image_hash(image_bytes):
+    """
+    Content address of an image file.
+    """
+    return hashlib.sha1(image_bytes).hexdigest()
+
+
+def analysis_key(content_hash, model_name, prompt):
+    payload = f"{content_hash}\0{model_name}\0{prompt}".encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()
+
+
+class VisionCache:
+    """
+    On-disk cache of vision-model answers keyed by (image content hash,
+    model, prompt).
+
+    Each store appends one JSON line to analyses.jsonl; when loading, the
+    last line for a key wins. Entries carry a last-used tick, and past
+    `max_entries` the least recently used answers are evicted. Evictions,
+    and a log grown to twice the live entries, rewrite the file with just
+    the live entries.
+    """
+
+    def __init__(self, cache_dir=VISION_CACHE_DIR, max_entries=VISION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.cache_file = os.path.join(cache_dir, "analyses.jsonl")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries, self._log_lines = self._read_log()
+        self.tick = max((entry["tick"] for entry in self.entries.values()), default=0)
+
+    def _read_log(self):
+        entries, lines = {}, 0
+        if not os.path.exists(self.cache_file):
+            return entries, lines
+        with open(self.cache_file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash mid-append
+                    logger.warning(f"Skipping a damaged line in {self.cache_file}")
+                    continue
+                entries[record.pop("key")] = record
+                lines += 1
+        return entries, lines
+
+    def _append(self, key, entry):
+        with open(self.cache_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(entry, key=key), separators=(",", ":")) + "\n")
+        self._log_lines += 1
+
+    def _compact(self):
+        """
+        Rewrite the log with one line per live entry.
+        """
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for key, entry in self.entries.items():
+                f.write(json.dumps(dict(entry, key=key), separators=(",", ":")) + "\n")
+        os.replace(tmp_file, self.cache_file)
+        self._log_lines = len(self.entries)
+
+    def lookup(self, content_hash, model_names, prompt):
+        """
+        Cached answer to `prompt` about this image from the first of
+        `model_names` that has one, or None.
+        """
+        with self._lock:
+            for model_name in model_names:
+                entry = self.entries.get(analysis_key(content_hash, model_name, prompt))
+                if entry is not None:
+                    self.hits += 1
+                    self.tick += 1
+                    entry["tick"] = self.tick
+                    return entry["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, content_hash, model_name, prompt, answer):
+        with self._lock:
+            self.tick += 1
+            key = analysis_key(content_hash, model_name, prompt)
+            self.entries[key] = {
+                "model": model_name,
+                "answer": answer,
+                "tick": self.tick,
+            }
+            overflow = len(self.entries) - self.max_entries
+            if overflow > 0:
+                # Evict a little extra so eviction does not run on every store
+                oldest = sorted(self.entries, key=lambda key: self.entries[key]["tick"])
+                for old_key in oldest[:overflow + self.max_entries // 10]:
+                    del self.entries[old_key]
+                self._compact()
+            elif self._log_lines >= 2 * len(self.entries):
+                self._compact()
+            else:
+                self._append(key, self.entries[key])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+_vision_cache = None
+_vision_cache_lock = threading.Lock()
+
+
+def get_vision_cache():
+    """
+    Return the process-wide VisionCache, or None when disabled in config.
+    """
+    global _vision_cache
+    if not VISION_CACHE_ENABLED:
+        return None
+    if _vision_cache is None:
+        with _vision_cache_lock:
+            if _vision_cache is None:
+                _vision_cache = VisionCache()
+    return _vision_cache
@@ -0,0 +1,115 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import Future, as_completed
+from src.config import VISION_MAX_IN_FLIGHT
+from src.utils import setup_logging
+
+logger = setup_logging()
+
+# Lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class VisionScheduler:
+    """
+    Bounded-concurrency runner for vision-model jobs.
+
+    At most `max_in_flight` jobs call Ollama at once (match it to the
+    server's OLLAMA_NUM_PARALLEL). Queued interactive jobs always start
+    before queued background jobs such as pre-captioning, so a user's
+    request waits for at most the jobs already running. Every job is a
+    concurrent.futures.Future and can be cancelled until it starts.
+    """
+
+    def __init__(self, max_in_flight=VISION_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()  # FIFO within a priority
+        self._pending = {}  # future -> priority, for queued and running jobs
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"vision-{i}", daemon=True)
+            for i in range(max_in_flight)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def _work(self):
+        while True:
+            _, _, future, fn, args = self._queue.get()
+            if future is None:
+                return
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                self._pending.pop(future, None)
+
+    def submit(self, fn, *args, priority=INTERACTIVE):
+        """
+        Queue fn(*args); returns its Future.
+        """
+        future = Future()
+        with self._lock:
+            self._pending[future] = priority
+        self._queue.put((priority, next(self._order), future, fn, args))
+        return future
+
+    def cancel(self, priority=None):
+        """
+        Cancel queued jobs (of one priority, or all). Running jobs finish.
+        Returns the number of jobs cancelled.
+        """
+        with self._lock:
+            futures = [f for f, p in self._pending.items() if priority is None or p == priority]
+        cancelled = sum(future.cancel() for future in futures)
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} queued vision job(s).")
+        return cancelled
+
+    def queued(self):
+        """
+        Number of jobs waiting for or holding a slot.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self):
+        self.cancel()
+        for _ in self._workers:
+            self._queue.put((float("inf"), next(self._order), None, None, None))
+
+
+def iter_completed(jobs):
+    """
+    Yield (key, result) for a {future: key} mapping as the jobs finish.
+    Closing the generator early cancels the jobs that have not started.
+    """
+    try:
+        for future in as_completed(jobs):
+            if not future.cancelled():
+                yield jobs[future], future.result()
+    finally:
+        for future in jobs:
+            future.cancel()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_vision_scheduler():
+    """
+    Return the process-wide VisionScheduler, so the in-flight limit holds
+    across every chat session.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = VisionScheduler()
+    return _scheduler
@@ -0,0 +1,152 @@
+"""
+Re-uploading a revised PDF: a small edit re-embeds only the chunks around
+the changed page and ends up with the same chunks as a full rebuild; a
+large one is rebuilt in full and replaces the previous version. Documents
+whose stored chunks went stale leave the corpus instead of breaking search.
+
+Usage (from the python/ directory):
+    python -m pytest -q tests
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+
+import fitz
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.chat_copy as chat_copy
+import src.image_handler as image_handler
+import src.pipeline as pipeline
+from src.corpus import Corpus
+
+PAGES = 40
+SENTENCES_PER_PAGE = 15
+DIM = 32
+
+
+class WordTokenizer:
+    """
+    Stand-in for the embedding tokenizer: one token per word or punctuation mark.
+    """
+
+    def __call__(self, texts, add_special_tokens=True, return_offsets_mapping=False):
+        offsets = [[match.span() for match in re.finditer(r"\w+|[^\w\s]", text)] for text in texts]
+        encoded = {"input_ids": [list(range(len(spans))) for spans in offsets]}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = offsets
+        return encoded
+
+
+def hashed_embeddings(texts):
+    vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % DIM] += 1
+    return vectors
+
+
+def write_pdf(path, edited_pages=()):
+    doc = fitz.open()
+    for page_num in range(1, PAGES + 1):
+        sentences = [
+            f"Section {page_num} clause {i} sets out term {page_num * 100 + i} of the agreement in plain words."
+            for i in range(SENTENCES_PER_PAGE)
+        ]
+        if page_num in edited_pages:
+            sentences[7] = "This clause was rewritten in the revision and now says something else entirely."
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), " ".join(sentences), fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def chunk_rows(chunks):
+    return sorted((c.page_start, c.page_end, c.char_start, c.char_end, c.text) for c in chunks)
+
+
+@pytest.fixture
+def chat_setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "get_tokenizer", WordTokenizer)
+    monkeypatch.setattr(pipeline, "CHUNK_TOKENS", 60)
+    monkeypatch.setattr(pipeline, "CHUNK_TOKEN_OVERLAP", 16)
+    monkeypatch.setattr(pipeline, "embed_text", hashed_embeddings)
+    monkeypatch.setattr(image_handler, "IMAGE_INDEX_ENABLED", False)
+
+    def make_chat(corpus_dir):
+        corpus = Corpus(str(tmp_path / corpus_dir))
+        monkeypatch.setattr(chat_copy, "get_corpus", lambda: corpus)
+        return chat_copy.PDFChat()
+
+    return tmp_path, make_chat
+
+
+def test_one_page_edit_reembeds_about_one_page(chat_setup):
+    tmp_path, make_chat = chat_setup
+    os.makedirs(tmp_path / "v1")
+    os.makedirs(tmp_path / "v2")
+    write_pdf(str(tmp_path / "v1" / "contract.pdf"))
+    write_pdf(str(tmp_path / "v2" / "contract.pdf"), edited_pages=(20,))
+
+    chat = make_chat("corpus")
+    chat.load_pdf(str(tmp_path / "v1" / "contract.pdf"))
+    old_ids = {chunk.chunk_id for chunk in chat.chunks}
+    chunks_per_page = len(old_ids) / PAGES
+    assert chunks_per_page >= 2
+
+    chat.load_pdf(str(tmp_path / "v2" / "contract.pdf"))
+    new_ids = {chunk.chunk_id for chunk in chat.chunks} - old_ids
+    assert len(chat.corpus.documents) == 1
+    assert chat.corpus.index.ntotal == len(chat.chunks)
+    # The edited page's chunks, plus at most one on either side
+    assert 0 < len(new_ids) <= chunks_per_page + 3
+
+    rebuilt = make_chat("rebuilt")
+    rebuilt.load_pdf(str(tmp_path / "v2" / "contract.pdf"))
+    assert chunk_rows(chat.chunks) == chunk_rows(rebuilt.chunks)
+
+
+def test_full_rebuild_replaces_previous_version(chat_setup):
+    tmp_path, make_chat = chat_setup
+    os.makedirs(tmp_path / "v1")
+    os.makedirs(tmp_path / "v2")
+    write_pdf(str(tmp_path / "v1" / "contract.pdf"))
+    write_pdf(str(tmp_path / "v2" / "contract.pdf"), edited_pages=range(1, PAGES + 1))
+
+    chat = make_chat("corpus")
+    chat.load_pdf(str(tmp_path / "v1" / "contract.pdf"))
+    chat.load_pdf(str(tmp_path / "v2" / "contract.pdf"))
+    assert list(chat.corpus.documents) == [chat.doc_id]
+    assert chat.corpus.index.ntotal == len(chat.chunks)
+
+
+def test_stale_document_is_dropped_from_corpus_search(chat_setup, monkeypatch):
+    tmp_path, make_chat = chat_setup
+    write_pdf(str(tmp_path / "contract.pdf"))
+    write_pdf(str(tmp_path / "amendment.pdf"), edited_pages=range(1, PAGES + 1))
+    monkeypatch.setattr(chat_copy, "embed_query", lambda query: hashed_embeddings([query])[0])
+
+    chat = make_chat("corpus")
+    chat.load_pdf(str(tmp_path / "amendment.pdf"))
+    stale_id = chat.doc_id
+    chat.load_pdf(str(tmp_path / "contract.pdf"))
+    manifest_path = os.path.join(chat.corpus.document_dir(stale_id), "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    with open(manifest_path, "w") as f:
+        json.dump(dict(manifest, version=0), f)
+
+    # A later session, e.g. after a settings change
+    chat = make_chat("corpus")
+    chat.load_pdf(str(tmp_path / "contract.pdf"))
+    chat.search_scope = "corpus"
+    chat.answer_cache = None
+    kind, _, _ = chat.prepare_answer("What was rewritten in the revision of this clause?")
+    assert kind == "prompt"
+    assert list(chat.corpus.documents) == [chat.doc_id]
+    assert chat.corpus.index.ntotal == len(chat.chunks)